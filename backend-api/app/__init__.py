@@ -6,7 +6,9 @@ from flask_bcrypt import Bcrypt
 from flask_cors import CORS # <-- New Import
 from flask_swagger_ui import get_swaggerui_blueprint
 from config import Config
+from app.json_provider import ORJSONProvider, dumps_bytes
 from datetime import datetime
+import logging
 import os
 
 # Initialize extensions outside of the app factory
@@ -18,19 +20,48 @@ def create_app(config_class=Config):
     
     
     app = Flask(__name__)
-    CORS(app, resources={r"/api/*": {"origins": "*"}}) # <-- Allow all origins for API endpoints
     app.config.from_object(config_class)
+    
+    # Service loggers (logging.getLogger(__name__)) report at LOG_LEVEL; below
+    # that level debug payloads are never formatted
+    logging.basicConfig(
+        level=app.config.get('LOG_LEVEL', 'INFO'),
+        format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+    )
+    
+    app.json = ORJSONProvider(app)  # orjson for jsonify(), Decimal and datetime included
+    CORS(app, resources={r"/api/*": {"origins": "*"}}) # <-- Allow all origins for API endpoints
 
+    # JSON/JSONB columns (audit metadata, raw AI data) are encoded with orjson too
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'json_serializer': lambda obj: dumps_bytes(obj).decode('utf-8'),
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    }
+    
     # Initialize extensions with the app
     db.init_app(app)
     bcrypt.init_app(app)
     
+    # Per-request SQL statement counting (X-Query-Count header)
+    if app.config.get('QUERY_COUNT_HEADER'):
+        from app.query_count import init_query_count
+        with app.app_context():
+            init_query_count(app, db.engine, app.config.get('QUERY_COUNT_WARN_THRESHOLD', 0))
+    
+    # Create the uploads directory once at startup instead of on every upload
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    
+    # Start the background audit log writer; without it, audit entries are
+    # buffered per request and inserted together at teardown
+    from app.services.audit_service import AuditLogWriter, AuditService
+    if app.config.get('AUDIT_LOG_ASYNC'):
+        AuditLogWriter.initialize(app)
+    app.teardown_request(AuditService.flush_request_buffer)
+    
     # Add error handlers
     @app.errorhandler(Exception)
     def handle_exception(e):
-        import traceback
-        app.logger.error(f"Unhandled exception: {e}")
-        app.logger.error(traceback.format_exc())
+        app.logger.exception(f"Unhandled exception: {e}")
         return {'error': 'Internal server error', 'message': str(e)}, 500
     
     # Import models so they are recognized by the ORM
@@ -147,7 +178,9 @@ def create_app(config_class=Config):
                 'database': 'connected' if db.engine else 'disconnected',
                 'mongodb': mongodb_status,
                 'gemini_api': 'configured' if Config.GEMINI_API_KEY else 'not configured'
-            }
+            },
+            'audit_log_overflow': AuditLogWriter.overflow_count(),
+            'audit_log_write_failures': AuditLogWriter.failed_count()
         }), 200
     # -----------------------------
 
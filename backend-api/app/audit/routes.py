@@ -27,6 +27,10 @@ def get_audit_logs():
         - limit (int): Maximum number of logs to return (default: 100, max: 1000)
         - offset (int): Number of logs to skip for pagination (default: 0)
         - order_by (str): Sort order - 'asc' or 'desc' (default: desc)
+        - after_timestamp (str): Keyset cursor - pass next_cursor.after_timestamp from the previous page
+        - after_id (int): Keyset cursor - pass next_cursor.after_id from the previous page
+        - view (str): 'full' (default) or 'summary' for a compact list without
+          request details (id, timestamp, user, action, resource, status)
     """
     # Parse query parameters
     user_id = request.args.get('user_id', type=int)
@@ -39,13 +43,13 @@ def get_audit_logs():
     
     if request.args.get('start_date'):
         try:
-            start_date = datetime.fromisoformat(request.args.get('start_date').replace('Z', '+00:00'))
+            start_date = AuditService.parse_timestamp(request.args.get('start_date'))
         except ValueError:
             return jsonify({'message': 'Invalid start_date format. Use ISO format (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)'}), 400
     
     if request.args.get('end_date'):
         try:
-            end_date = datetime.fromisoformat(request.args.get('end_date').replace('Z', '+00:00'))
+            end_date = AuditService.parse_timestamp(request.args.get('end_date'))
         except ValueError:
             return jsonify({'message': 'Invalid end_date format. Use ISO format (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)'}), 400
     
@@ -63,6 +67,18 @@ def get_audit_logs():
     offset = request.args.get('offset', 0, type=int)
     order_by = request.args.get('order_by', 'desc')
     
+    # Keyset cursor (preferred over offset for deep pages)
+    after_timestamp = None
+    after_id = request.args.get('after_id', type=int)
+    
+    if request.args.get('after_timestamp'):
+        try:
+            after_timestamp = AuditService.parse_timestamp(request.args.get('after_timestamp'))
+        except ValueError:
+            return jsonify({'message': 'Invalid after_timestamp format. Use ISO format (YYYY-MM-DDTHH:MM:SS)'}), 400
+    
+    summary = request.args.get('view', 'full').lower() == 'summary'
+    
     # Get logs
     logs = AuditService.get_logs(
         user_id=user_id,
@@ -73,14 +89,25 @@ def get_audit_logs():
         success=success,
         limit=limit,
         offset=offset,
-        order_by=order_by
+        order_by=order_by,
+        after_timestamp=after_timestamp,
+        after_id=after_id,
+        summary=summary
     )
     
+    next_cursor = None
+    if len(logs) == limit:
+        next_cursor = {
+            'after_timestamp': logs[-1].timestamp.isoformat(),
+            'after_id': logs[-1].id
+        }
+    
     return jsonify({
-        'logs': [log.to_dict() for log in logs],
+        'logs': [log.to_summary_dict() if summary else log.to_dict() for log in logs],
         'count': len(logs),
         'limit': limit,
-        'offset': offset
+        'offset': offset,
+        'next_cursor': next_cursor
     }), 200
 
 
@@ -234,13 +261,13 @@ def get_audit_statistics():
         # Parse custom dates
         if request.args.get('start_date'):
             try:
-                start_date = datetime.fromisoformat(request.args.get('start_date').replace('Z', '+00:00'))
+                start_date = AuditService.parse_timestamp(request.args.get('start_date'))
             except ValueError:
                 return jsonify({'message': 'Invalid start_date format'}), 400
         
         if request.args.get('end_date'):
             try:
-                end_date = datetime.fromisoformat(request.args.get('end_date').replace('Z', '+00:00'))
+                end_date = AuditService.parse_timestamp(request.args.get('end_date'))
             except ValueError:
                 return jsonify({'message': 'Invalid end_date format'}), 400
     
@@ -283,13 +310,13 @@ def export_audit_logs():
     
     if request.args.get('start_date'):
         try:
-            start_date = datetime.fromisoformat(request.args.get('start_date').replace('Z', '+00:00'))
+            start_date = AuditService.parse_timestamp(request.args.get('start_date'))
         except ValueError:
             pass
     
     if request.args.get('end_date'):
         try:
-            end_date = datetime.fromisoformat(request.args.get('end_date').replace('Z', '+00:00'))
+            end_date = AuditService.parse_timestamp(request.args.get('end_date'))
         except ValueError:
             pass
     
@@ -2,9 +2,13 @@
 
 from flask import Blueprint, request, jsonify, g
 from app import db
-from app.models import User, UserRole
+from app.models import User
+from app.services.user_management_service import resolve_role, ROLE_NAMES
 from app.services.audit_service import AuditService
 from app.utils import generate_session_id
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Define the Blueprint. The URL prefix will be '/api/auth' when registered.
 bp = Blueprint('auth', __name__)
@@ -23,13 +27,9 @@ def register():
     password = data['password']
     
     # Optional: Allow setting a role for initial setup, default to BASIC_USER
-    role_str = data.get('role', 'BASIC_USER').upper()
-    try:
-        # Convert string input to the defined UserRole Enum
-        role_enum = UserRole[role_str]
-        role = role_enum.value
-    except KeyError:
-        return jsonify({'message': f'Invalid role specified. Must be one of: {", ".join(r.name for r in UserRole)}'}), 400
+    role = resolve_role(data.get('role', 'BASIC_USER'))
+    if role is None:
+        return jsonify({'message': f'Invalid role specified. Must be one of: {ROLE_NAMES}'}), 400
 
     # 2. Check if user already exists
     if User.query.filter_by(username=username).first():
@@ -76,7 +76,9 @@ def login():
         # 2. Verify User Credentials
         user = User.query.filter_by(username=data['username']).first()
         
-        if user is None or not user.check_password(data['password']):
+        password_ok = user.check_password(data['password']) if user else User.burn_password_check(data['password'])
+        
+        if not password_ok:
             # Log failed login attempt
             AuditService.log_authentication(
                 action='LOGIN_FAILED',
@@ -110,9 +112,7 @@ def login():
             'expires_in': 3600 # 1 hour
         })
     except Exception as e:
-        import traceback
-        print(f"Login error: {e}")
-        print(traceback.format_exc())
+        logger.exception(f"Login error: {e}")
         
         # Log error
         AuditService.log_authentication(
@@ -19,12 +19,22 @@ except ImportError:
     logger.warning("SchedulerService not available - manual exchange rate updates disabled")
 
 
+# Set once the currency tables have been seen; they are never dropped at
+# runtime, so later requests skip the information_schema query
+_currency_tables_found = False
+
+
 def check_currency_tables_exist():
     """Check if currency tables exist in the database."""
+    global _currency_tables_found
+    if _currency_tables_found:
+        return True
+    
     try:
         inspector = inspect(db.engine)
         tables = inspector.get_table_names()
-        return 'currencies' in tables and 'exchange_rates' in tables
+        _currency_tables_found = 'currencies' in tables and 'exchange_rates' in tables
+        return _currency_tables_found
     except Exception as e:
         logger.error(f"Error checking tables: {e}")
         return False
@@ -0,0 +1,40 @@
+# app/http_session.py
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def create_session(pool_connections=10, pool_maxsize=20, headers=None):
+    """
+    Create a requests.Session with pooled, retrying adapters.
+    
+    Sharing one session keeps TCP/TLS connections alive between outbound
+    calls instead of opening a new connection for every request.
+    
+    Args:
+        pool_connections (int): Number of hosts to keep connection pools for
+        pool_maxsize (int): Maximum kept-alive connections per host
+        headers (dict): Default headers sent with every request
+    
+    Returns:
+        requests.Session: The configured session
+    """
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD'])
+    )
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+    
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+# Module-level session shared by the services (exchange-rate API, ...)
+http_session = create_session()
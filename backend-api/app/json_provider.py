@@ -0,0 +1,38 @@
+# app/json_provider.py
+
+from decimal import Decimal
+from flask.json.provider import JSONProvider
+import orjson
+
+
+def orjson_default(obj):
+    """Serialize types orjson does not handle natively (Decimal); reject anything else."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def dumps_bytes(obj):
+    """Encode obj to JSON bytes using the app-wide orjson settings."""
+    # Non-string dict keys (ints, dates, ...) are accepted, as with the stdlib json
+    return orjson.dumps(obj, default=orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ORJSONProvider(JSONProvider):
+    """
+    Flask JSON provider backed by orjson.
+    Datetimes, dates and UUIDs are serialized natively (ISO 8601), and
+    Decimals are emitted as numbers, so routes can return model values as-is.
+    """
+    
+    mimetype = 'application/json'
+    
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
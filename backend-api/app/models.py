@@ -19,6 +19,9 @@ class UserRole(Enum):
     def __str__(self):
         return self.value
 
+# bcrypt hash of a random throwaway secret, checked when a login names an unknown user
+_DUMMY_PASSWORD_HASH = '$2b$12$M8e63eMd9aUJ/noZ8NKNKOnO38co6/JEJXNqaT9tTkqojnI/9daUi'
+
 class User(db.Model):
     __tablename__ = 'users'
 
@@ -52,8 +55,21 @@ class User(db.Model):
         self.password_hash = generate_password_hash(password).decode('utf-8')
 
     def check_password(self, password):
-        """Checks the stored hash against the provided password."""
+        """
+        Checks the stored hash against the provided password.
+        flask_bcrypt re-hashes the candidate and compares with hmac.compare_digest;
+        never replace this with a direct == on hashes (timing side-channel).
+        """
         return check_password_hash(self.password_hash, password)
+    
+    @staticmethod
+    def burn_password_check(password):
+        """
+        Spend the same bcrypt work as check_password for a username that does not
+        exist, so login response times don't reveal which usernames are registered.
+        """
+        check_password_hash(_DUMMY_PASSWORD_HASH, password)
+        return False
 
     def generate_auth_token(self, expires_in=3600):
         """Generates a JWT for API authentication (valid for 1 hour by default)."""
@@ -70,19 +86,27 @@ class User(db.Model):
         )
 
     @staticmethod
-    def verify_auth_token(token):
-        """Decodes and verifies a JWT token."""
+    def decode_auth_token(token):
+        """Decodes and verifies a JWT token, returning its claims (or None)."""
         try:
-            data = jwt.decode(
+            # jwt.decode checks the HS256 signature with hmac.compare_digest
+            return jwt.decode(
                 token, 
                 Config.SECRET_KEY, 
                 algorithms=['HS256']
             )
         except:
             return None
+    
+    @staticmethod
+    def verify_auth_token(token):
+        """Decodes and verifies a JWT token."""
+        data = User.decode_auth_token(token)
+        if data is None:
+            return None
         
         # Return the User object if verification is successful
-        return User.query.get(data['user_id'])
+        return db.session.get(User, data['user_id'])
 
     def __repr__(self):
         return f'<User {self.username}, Role: {self.role}>'
@@ -108,6 +132,10 @@ class Receipt(db.Model):
     status = db.Column(db.String(50), default='PENDING', nullable=False) # E.g., PENDING, PROCESSED, ERROR
     
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
+    
+    # Background re-extraction of ERROR receipts (see ReceiptReprocessService)
+    reprocess_attempts = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    last_reprocess_at = db.Column(db.DateTime, nullable=True)
 
     # Relationship to transactions (One-to-One: one receipt creates one transaction)
     transaction = db.relationship('Transaction', backref='source_receipt', uselist=False)
@@ -199,9 +227,9 @@ class ExchangeRate(db.Model):
     # Relationship to currency
     currency = db.relationship('Currency', backref=db.backref('exchange_rates', lazy='dynamic'))
     
-    # Composite unique constraint to prevent duplicate rates for same currency at same time
+    # Latest-rate lookups: WHERE currency_code = ? ORDER BY timestamp DESC LIMIT 1
     __table_args__ = (
-        db.Index('idx_currency_timestamp', 'currency_code', 'timestamp'),
+        db.Index('idx_rate_code_ts', 'currency_code', db.text('timestamp DESC')),
     )
     
     def __repr__(self):
@@ -245,8 +273,18 @@ class AuditLog(db.Model):
     ip_address = db.Column(db.String(45), nullable=True)  # IPv4 or IPv6
     user_agent = db.Column(db.String(512), nullable=True)  # Browser/client information
     
-    # When: Timestamp
-    timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow, nullable=False)
+    # When: Timestamp (naive UTC like the other timestamps). The Python default
+    # stays alongside the server default: databases that have not re-run
+    # migrate_add_audit_logs.py have no default on the column.
+    # No single-column index: idx_audit_list_covering leads with timestamp and
+    # idx_audit_ts_brin covers wide ranges, so one more B-tree would only add
+    # write cost to every audit insert
+    timestamp = db.Column(
+        db.DateTime,
+        default=datetime.utcnow,
+        server_default=db.text("(clock_timestamp() AT TIME ZONE 'utc')"),
+        nullable=False
+    )
     
     # Result: Status and details
     status_code = db.Column(db.Integer, nullable=True)  # HTTP status code
@@ -262,9 +300,47 @@ class AuditLog(db.Model):
     # Relationship to User
     user = db.relationship('User', backref=db.backref('audit_logs', lazy='dynamic'))
     
+    # Indexes matching the AuditService query shapes (see migrate_add_query_indexes.py)
+    __table_args__ = (
+        db.Index(
+            'idx_audit_list_covering', db.text('timestamp DESC'), db.text('id DESC'),
+            postgresql_include=['user_id', 'username', 'action', 'resource_type', 'resource_id', 'success', 'status_code']
+        ),  # get_logs keyset pagination; index-only scans for the summary view
+        db.Index('idx_audit_user_ts', 'user_id', db.text('timestamp DESC')),  # get_user_activity / get_logs by user
+        db.Index(
+            'idx_audit_failed_login', 'username', db.text('timestamp DESC'),
+            postgresql_where=db.text("action = 'LOGIN_FAILED'")
+        ),  # get_failed_logins
+        db.Index('idx_audit_resource', 'resource_type', 'resource_id', db.text('timestamp DESC')),  # get_resource_history
+        db.Index(
+            'idx_audit_ts_brin', 'timestamp',
+            postgresql_using='brin', postgresql_with={'pages_per_range': 32}
+        ),  # wide time-range scans (statistics, exports) on the append-only table
+    )
+    
     def __repr__(self):
         return f'<AuditLog {self.id}: {self.action} by {self.username} at {self.timestamp}>'
     
+    # Columns returned by the summary list view (all stored in idx_audit_list_covering)
+    SUMMARY_COLUMNS = (
+        'id', 'timestamp', 'user_id', 'username', 'action',
+        'resource_type', 'resource_id', 'success', 'status_code'
+    )
+    
+    def to_summary_dict(self):
+        """Convert audit log to a compact dictionary (SUMMARY_COLUMNS only)."""
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'username': self.username,
+            'action': self.action,
+            'resource_type': self.resource_type,
+            'resource_id': self.resource_id,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'status_code': self.status_code,
+            'success': self.success
+        }
+    
     def to_dict(self):
         """Convert audit log to dictionary for API responses."""
         return {
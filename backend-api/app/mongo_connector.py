@@ -8,6 +8,21 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Index matching the get_by_user query shape (filter uploader/archived, newest first)
+USER_RECEIPTS_INDEX = [('uploader_id', 1), ('archived', 1), ('created_at', -1)]
+
+# Cached Gemini extractions (payer data) expire this long after they are stored
+AI_EXTRACTIONS_TTL = 30 * 24 * 3600  # seconds
+
+# Heavy fields left out of list responses (fetch a single receipt for them)
+LIST_EXCLUDED_FIELDS = {'raw_ai_data': 0, 'image_data': 0}
+
+# Final list pipeline stages: drop heavy fields and stringify _id on the server
+LIST_OUTPUT_STAGES = [
+    {'$project': LIST_EXCLUDED_FIELDS},
+    {'$addFields': {'_id': {'$toString': '$_id'}}}
+]
+
 class MongoDBConnector:
     """
     MongoDB connector for managing receipt documents with archiving capabilities.
@@ -63,8 +78,22 @@ class MongoDBConnector:
         receipts_collection.create_index([('archive_date', 1)])
         
         # Compound indexes for common queries
-        receipts_collection.create_index([('uploader_id', 1), ('status', 1)])
+        receipts_collection.create_index([('uploader_id', 1), ('status', 1), ('metadata.transaction_date', 1)])
         receipts_collection.create_index([('archived', 1), ('created_at', -1)])
+        receipts_collection.create_index(USER_RECEIPTS_INDEX)  # /mongo/user
+        receipts_collection.create_index([('archived', 1), ('archive_date', -1)])  # /mongo/archived (admin)
+        receipts_collection.create_index([('uploader_id', 1), ('archived', 1), ('archive_date', -1)])  # /mongo/archived (user)
+        
+        # Text index for /mongo/search
+        receipts_collection.create_index([
+            ('metadata.vendor_name', 'text'),
+            ('metadata.receipt_number', 'text'),
+            ('tags', 'text')
+        ], name='receipt_text_search')
+        
+        # Gemini extraction results keyed by image content hash
+        cls._db.ai_extractions.create_index([('image_hash', 1)], unique=True)
+        cls._db.ai_extractions.create_index([('created_at', 1)], expireAfterSeconds=AI_EXTRACTIONS_TTL)
         
         logger.info("MongoDB collections and indexes set up successfully")
     
@@ -210,19 +239,34 @@ class ReceiptDocument:
     
     @staticmethod
     def get_by_user(uploader_id, include_archived=False, limit=100, skip=0):
-        """Get all receipts for a user."""
+        """
+        Get all receipts for a user, without heavy fields and with _id as a string.
+        """
+        return list(ReceiptDocument.find_by_user(uploader_id, include_archived, limit, skip))
+    
+    @staticmethod
+    def find_by_user(uploader_id, include_archived=False, limit=100, skip=0):
+        """
+        Get a cursor over a user's receipts (same shape as get_by_user).
+        Use this instead of get_by_user to iterate lazily.
+        """
         collection = MongoDBConnector.get_collection('receipts')
         
         query = {'uploader_id': uploader_id}
         if not include_archived:
             query['archived'] = False
         
-        return list(
-            collection.find(query)
-            .sort('created_at', -1)
-            .skip(skip)
-            .limit(limit)
-        )
+        pipeline = [
+            {'$match': query},
+            {'$sort': {'created_at': -1}},
+            {'$skip': skip},
+            {'$limit': limit},
+            *LIST_OUTPUT_STAGES
+        ]
+        
+        if not include_archived:
+            return collection.aggregate(pipeline, hint=USER_RECEIPTS_INDEX, batchSize=50)
+        return collection.aggregate(pipeline, batchSize=50)
     
     @staticmethod
     def get_archived_receipts(uploader_id=None, days_old=None):
@@ -233,6 +277,15 @@ class ReceiptDocument:
             uploader_id: Filter by specific user
             days_old: Filter receipts archived more than X days ago
         """
+        return list(ReceiptDocument.find_archived(uploader_id, days_old))
+    
+    @staticmethod
+    def find_archived(uploader_id=None, days_old=None):
+        """
+        Get a cursor over archived receipts with optional filters.
+        Use this instead of get_archived_receipts to iterate lazily.
+        Documents come without heavy fields and with _id as a string.
+        """
         collection = MongoDBConnector.get_collection('receipts')
         
         query = {'archived': True}
@@ -245,7 +298,11 @@ class ReceiptDocument:
             cutoff_date = datetime.utcnow() - timedelta(days=days_old)
             query['archive_date'] = {'$lt': cutoff_date}
         
-        return list(collection.find(query).sort('archive_date', -1))
+        return collection.aggregate([
+            {'$match': query},
+            {'$sort': {'archive_date': -1}},
+            *LIST_OUTPUT_STAGES
+        ])
     
     @staticmethod
     def update_document(receipt_id, updates):
@@ -0,0 +1,36 @@
+# app/query_count.py
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def init_query_count(app, engine, warn_threshold=0):
+    """
+    Count SQL statements per request and report them in an X-Query-Count
+    response header, so N+1 regressions show up while developing or in
+    integration runs.
+    
+    Args:
+        app: Flask application
+        engine: SQLAlchemy engine to instrument
+        warn_threshold (int): Log a warning when a request issues more
+            statements than this (0 = never warn)
+    """
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        # Background threads (audit writer, scheduler) have no request to charge
+        if has_request_context():
+            g.query_count = g.get('query_count', 0) + 1
+    
+    @app.after_request
+    def add_query_count_header(response):
+        count = g.get('query_count', 0)
+        response.headers['X-Query-Count'] = str(count)
+        
+        if warn_threshold and count > warn_threshold:
+            logger.warning(f"{count} SQL statements for {request.method} {request.path}")
+        
+        return response
@@ -1,16 +1,27 @@
 # app/receipts/routes.py
 
-from flask import Blueprint, request, jsonify, g, send_from_directory
+from flask import Blueprint, request, jsonify, g, send_from_directory, Response
+from sqlalchemy import update, select, func, cast
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import joinedload
 from app import db
 from app.models import UserRole, Receipt, Transaction
-from app.utils import jwt_required, role_required, audit_log
-from app.services.gemini_service import extract_receipt_data
+from app.utils import jwt_required, role_required, audit_log, stream_json_list
+from app.services.gemini_service import extract_receipt_data, ExtractionBatcher
 from app.services.audit_service import AuditService
 from app.services.receipt_mongo_service import ReceiptMongoService
-from decimal import Decimal, InvalidOperation # For robust currency handling
+from datetime import date, datetime
+from pydantic import ValidationError
+from app.schemas import ConfirmPayload, ReceiptExtraction, validation_error_message
 import os
-from werkzeug.utils import secure_filename
+import mimetypes
+from werkzeug.utils import secure_filename, safe_join
+from werkzeug.exceptions import NotFound
+from werkzeug.http import http_date
 from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint('receipts', __name__)
 
@@ -20,10 +31,20 @@ def serve_uploaded_file(filename):
     Serve uploaded receipt images.
     Public endpoint - no authentication required for viewing images.
     """
+    # Behind Nginx, hand the transfer off to the web server (kernel sendfile)
+    accel_prefix = Config.UPLOADS_ACCEL_REDIRECT_PREFIX
+    if accel_prefix:
+        if safe_join(Config.UPLOAD_FOLDER, filename) is None:
+            return jsonify({'message': 'File not found'}), 404
+        return Response(headers={
+            'X-Accel-Redirect': accel_prefix.rstrip('/') + '/' + filename,
+            'Content-Type': mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        })
+    
+    # Otherwise send_from_directory streams via wsgi.file_wrapper (or X-Sendfile if USE_X_SENDFILE)
     try:
-        upload_folder = Config.UPLOAD_FOLDER
-        return send_from_directory(upload_folder, filename)
-    except FileNotFoundError:
+        return send_from_directory(Config.UPLOAD_FOLDER, filename)
+    except (FileNotFoundError, NotFound):
         return jsonify({'message': 'File not found'}), 404
 
 @bp.route('/upload', methods=['POST'])
@@ -61,21 +82,16 @@ def upload_receipt():
         if not filename or '.' not in filename:
             return jsonify({'message': 'Invalid file name.'}), 400
         
-        file_ext = filename.rsplit('.', 1)[1].lower()
+        file_ext = filename.rpartition('.')[2].lower()
         if file_ext not in Config.ALLOWED_EXTENSIONS:
-            return jsonify({'message': f'File type not allowed. Allowed types: {Config.ALLOWED_EXTENSIONS}'}), 400
+            return jsonify({'message': f"File type not allowed. Allowed types: {', '.join(sorted(Config.ALLOWED_EXTENSIONS))}"}), 400
         
         # Create unique filename to avoid collisions
         import time
         unique_filename = f"{int(time.time())}_{filename}"
         
-        # Ensure uploads directory exists
-        upload_folder = Config.UPLOAD_FOLDER
-        if not os.path.exists(upload_folder):
-            os.makedirs(upload_folder)
-        
-        # Save file to disk
-        file_path = os.path.join(upload_folder, unique_filename)
+        # Save file to disk (uploads directory is created in create_app)
+        file_path = os.path.join(Config.UPLOAD_FOLDER, unique_filename)
         file.save(file_path)
         
         # Store the file object for processing (reset pointer after save)
@@ -103,7 +119,10 @@ def upload_receipt():
     # --- AI INTEGRATION ---
     
     # 3. Call the Gemini Extraction Service
-    if image_file:
+    if Config.GEMINI_MICRO_BATCH:
+        # Shares a multi-image request with other uploads arriving at the same time
+        extracted_data = ExtractionBatcher.extract(image_file or image_url)
+    elif image_file:
         extracted_data = extract_receipt_data(image_file=image_file)
     else:
         extracted_data = extract_receipt_data(image_url=image_url)
@@ -119,6 +138,18 @@ def upload_receipt():
             'receipt_id': receipt_id
         }), 500
         
+    # Normalize the AI output once and reuse the typed object below
+    try:
+        extraction = ReceiptExtraction.model_validate(extracted_data)
+    except ValidationError as e:
+        new_receipt.status = 'ERROR'
+        db.session.commit()
+        return jsonify({
+            'message': 'AI extraction failed.',
+            'error': f'Unexpected extraction format: {e.error_count()} invalid field(s)',
+            'receipt_id': receipt_id
+        }), 500
+    
     # --- Save extracted data for confirmation ---
     
     # Update receipt with raw data
@@ -128,13 +159,7 @@ def upload_receipt():
     # --- Save to MongoDB for long-term storage ---
     try:
         # Prepare metadata for MongoDB
-        metadata = {
-            'vendor_name': extracted_data.get('vendor_name'),
-            'total_amount': float(extracted_data.get('total_amount', 0)) if extracted_data.get('total_amount') else None,
-            'currency': extracted_data.get('currency', 'USD'),
-            'transaction_date': extracted_data.get('transaction_date'),
-            'receipt_number': extracted_data.get('receipt_number')
-        }
+        metadata = extraction.to_metadata()
         
         # Get file info if available
         file_size = None
@@ -145,8 +170,8 @@ def upload_receipt():
             image_file.seek(0)  # Reset
             mime_type = image_file.content_type
         
-        # Save to MongoDB
-        ReceiptMongoService.save_receipt(
+        # Save to MongoDB in the background, the response doesn't depend on it
+        ReceiptMongoService.save_receipt_async(
             receipt_id=receipt_id,
             uploader_id=uploader_id,
             image_url=image_url,
@@ -158,21 +183,13 @@ def upload_receipt():
         )
     except Exception as e:
         # Log error but don't fail the request
-        import logging
-        logging.error(f"Failed to save receipt to MongoDB: {e}")
+        logger.error(f"Failed to save receipt to MongoDB: {e}")
 
     # Return extracted data for user confirmation
     return jsonify({
         'message': 'Receipt uploaded and data extracted successfully. Please review and confirm.',
         'receipt_id': receipt_id,
-        'extracted_data': {
-            'vendor_name': extracted_data.get('vendor_name'),
-            'receipt_number': extracted_data.get('receipt_number'),
-            'total_amount': extracted_data.get('total_amount'),
-            'currency': extracted_data.get('currency', 'USD'),
-            'transaction_date': extracted_data.get('transaction_date'),
-            'payer_name': extracted_data.get('payer_name')
-        },
+        'extracted_data': extraction.to_response(),
         'requires_confirmation': True
     }), 200
 
@@ -199,12 +216,16 @@ def confirm_receipt():
         "payer_name": "John Doe"
     }
     """
-    data = request.get_json()
-    
-    if not data or not data.get('receipt_id'):
-        return jsonify({'message': 'Missing required field: receipt_id'}), 400
+    # Validate and convert the payload in one step
+    try:
+        payload = ConfirmPayload.model_validate(request.get_json(silent=True) or {})
+    except ValidationError as e:
+        return jsonify({
+            'message': validation_error_message(e),
+            'hint': 'Ensure total_amount is a valid number and transaction_date is in YYYY-MM-DD format'
+        }), 400
     
-    receipt_id = data.get('receipt_id')
+    receipt_id = payload.receipt_id
     uploader_id = g.current_user.id
     
     # Verify receipt exists and belongs to the user
@@ -219,27 +240,11 @@ def confirm_receipt():
     if receipt.status != 'PENDING_CONFIRMATION':
         return jsonify({'message': f'Receipt cannot be confirmed. Current status: {receipt.status}'}), 400
     
-    # Validate required fields
-    required_fields = ['vendor_name', 'total_amount', 'transaction_date']
-    missing_fields = [field for field in required_fields if not data.get(field)]
-    
-    if missing_fields:
-        return jsonify({'message': f'Missing required fields: {", ".join(missing_fields)}'}), 400
-    
-    # Validate and convert data
-    try:
-        from datetime import datetime
-        total_amount = Decimal(str(data.get('total_amount')))
-        transaction_date = datetime.strptime(data.get('transaction_date'), '%Y-%m-%d')
-        
-    except (InvalidOperation, ValueError) as e:
-        return jsonify({
-            'message': f'Invalid data format: {e}',
-            'hint': 'Ensure total_amount is a valid number and transaction_date is in YYYY-MM-DD format'
-        }), 400
+    total_amount = payload.total_amount
+    transaction_date = datetime.combine(payload.transaction_date, datetime.min.time())
     
     # Get original currency and convert to USD (base currency)
-    original_currency = data.get('currency', 'USD')
+    original_currency = payload.currency
     original_amount = total_amount
     
     # Convert to USD if needed
@@ -249,32 +254,29 @@ def confirm_receipt():
     
     if original_currency != 'USD':
         try:
-            converted_amount, rate_used, _ = CurrencyService.convert_amount(
-                float(total_amount),
+            usd_amount, exchange_rate_used, _ = CurrencyService.convert_amount(
+                total_amount,
                 original_currency,
                 'USD'
             )
-            usd_amount = Decimal(str(converted_amount))
-            exchange_rate_used = Decimal(str(rate_used))
         except Exception as e:
-            import logging
-            logging.warning(f"Currency conversion failed: {e}. Using original amount.")
+            logger.warning(f"Currency conversion failed: {e}. Using original amount.")
             # If conversion fails, use original amount and log warning
     
     # Create the transaction with user-confirmed data
     new_transaction = Transaction(
         receipt_id=receipt_id,
-        vendor_name=data.get('vendor_name'),
-        receipt_number=data.get('receipt_number'),
+        vendor_name=payload.vendor_name,
+        receipt_number=payload.receipt_number,
         original_amount=original_amount,
         original_currency=original_currency,
         total_amount=usd_amount,
         currency='USD',
         exchange_rate_used=exchange_rate_used,
         transaction_date=transaction_date,
-        payer_name=data.get('payer_name'),
+        payer_name=payload.payer_name,
         payer_id=uploader_id,
-        description=data.get('description', f"Transaction processed from Receipt ID {receipt_id}"),
+        description=payload.description or f"Transaction processed from Receipt ID {receipt_id}",
     )
     
     db.session.add(new_transaction)
@@ -290,17 +292,16 @@ def confirm_receipt():
             updates={
                 'status': 'PROCESSED',
                 'metadata': {
-                    'vendor_name': data.get('vendor_name'),
+                    'vendor_name': payload.vendor_name,
                     'total_amount': float(total_amount),
-                    'currency': data.get('currency', 'USD'),
+                    'currency': original_currency,
                     'transaction_date': transaction_date.isoformat(),
-                    'receipt_number': data.get('receipt_number')
+                    'receipt_number': payload.receipt_number
                 }
             }
         )
     except Exception as e:
-        import logging
-        logging.error(f"Failed to update receipt in MongoDB: {e}")
+        logger.error(f"Failed to update receipt in MongoDB: {e}")
     
     return jsonify({
         'message': 'Receipt confirmed and transaction saved successfully.',
@@ -317,42 +318,71 @@ def confirm_receipt():
     }), 201
 
 
+def _serialize_transaction(txn):
+    """Format a Transaction row for the /transactions response (Decimals/datetimes are encoded by orjson)."""
+    receipt = txn.source_receipt
+    return {
+        'id': txn.id,
+        'vendor_name': txn.vendor_name,
+        'receipt_number': txn.receipt_number,
+        'original_amount': txn.original_amount or txn.total_amount,
+        'original_currency': txn.original_currency or txn.currency,
+        'total_amount': txn.total_amount,
+        'currency': txn.currency,
+        'exchange_rate_used': txn.exchange_rate_used or None,
+        'transaction_date': txn.transaction_date,
+        'payer_name': txn.payer_name,
+        'description': txn.description,
+        'receipt_id': txn.receipt_id,
+        'image_url': receipt.image_url if receipt else None,
+        'status': receipt.status if receipt else None
+    }
+
+
 @bp.route('/transactions', methods=['GET'])
 @jwt_required()
 def get_transactions():
     """
     Retrieves all transactions for the authenticated user.
     Returns a list of transactions with receipt information.
+    The response is streamed row by row to keep memory flat for large histories.
     """
     user_id = g.current_user.id
     
-    # Query transactions where the user is the payer
-    transactions = Transaction.query.filter_by(payer_id=user_id).order_by(Transaction.transaction_date.desc()).all()
-    
-    # Format the response
-    result = []
-    for txn in transactions:
-        result.append({
-            'id': txn.id,
-            'vendor_name': txn.vendor_name,
-            'receipt_number': txn.receipt_number,
-            'original_amount': float(txn.original_amount) if hasattr(txn, 'original_amount') and txn.original_amount else float(txn.total_amount),
-            'original_currency': txn.original_currency if hasattr(txn, 'original_currency') and txn.original_currency else txn.currency,
-            'total_amount': float(txn.total_amount),
-            'currency': txn.currency,
-            'exchange_rate_used': float(txn.exchange_rate_used) if hasattr(txn, 'exchange_rate_used') and txn.exchange_rate_used else None,
-            'transaction_date': txn.transaction_date.isoformat() if txn.transaction_date else None,
-            'payer_name': txn.payer_name,
-            'description': txn.description,
-            'receipt_id': txn.receipt_id,
-            'image_url': txn.source_receipt.image_url if txn.source_receipt else None,
-            'status': txn.source_receipt.status if txn.source_receipt else None
-        })
+    # Query transactions where the user is the payer, loading the receipt in the same query
+    transactions = Transaction.query\
+        .options(joinedload(Transaction.source_receipt))\
+        .filter_by(payer_id=user_id)\
+        .order_by(Transaction.transaction_date.desc())\
+        .yield_per(500)
     
-    return jsonify({
-        'transactions': result,
-        'count': len(result)
-    }), 200
+    return stream_json_list('transactions', transactions, _serialize_transaction)
+
+
+def _update_unprocessed_receipt(receipt_id, uploader_id, **values):
+    """
+    Update a receipt owned by uploader_id that is not yet PROCESSED, in one UPDATE.
+    Returns True if a row was updated.
+    """
+    result = db.session.execute(
+        update(Receipt)
+        .where(
+            Receipt.id == receipt_id,
+            Receipt.uploader_id == uploader_id,
+            Receipt.status != 'PROCESSED'
+        )
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount > 0
+
+
+def _receipt_status(receipt_id, uploader_id):
+    """Return the status of a receipt owned by uploader_id, or None if not found."""
+    return db.session.execute(
+        select(Receipt.status).where(Receipt.id == receipt_id, Receipt.uploader_id == uploader_id)
+    ).scalar()
 
 
 @bp.route('/cancel', methods=['POST'])
@@ -377,19 +407,12 @@ def cancel_receipt():
     receipt_id = data.get('receipt_id')
     uploader_id = g.current_user.id
     
-    # Verify receipt exists and belongs to the user
-    receipt = Receipt.query.filter_by(id=receipt_id, uploader_id=uploader_id).first()
-    
-    if not receipt:
+    # Mark receipt as cancelled in a single UPDATE (owned by the user and not yet processed)
+    if not _update_unprocessed_receipt(receipt_id, uploader_id, status='CANCELLED'):
+        if _receipt_status(receipt_id, uploader_id) == 'PROCESSED':
+            return jsonify({'message': 'Cannot cancel a receipt that has already been processed.'}), 400
         return jsonify({'message': 'Receipt not found or you do not have permission to cancel it.'}), 404
     
-    if receipt.status == 'PROCESSED':
-        return jsonify({'message': 'Cannot cancel a receipt that has already been processed.'}), 400
-    
-    # Mark receipt as cancelled
-    receipt.status = 'CANCELLED'
-    db.session.commit()
-    
     return jsonify({
         'message': 'Receipt cancelled successfully.',
         'receipt_id': receipt_id
@@ -422,26 +445,21 @@ def reject_receipt():
     reason = data.get('reason', 'No reason provided')
     uploader_id = g.current_user.id
     
-    # Verify receipt exists and belongs to the user
-    receipt = Receipt.query.filter_by(id=receipt_id, uploader_id=uploader_id).first()
+    # Mark receipt as rejected and merge the reason into raw_ai_data server-side (jsonb ||)
+    rejected = _update_unprocessed_receipt(
+        receipt_id,
+        uploader_id,
+        status='REJECTED',
+        raw_ai_data=func.coalesce(Receipt.raw_ai_data, cast('{}', JSONB)).op('||')(
+            func.jsonb_build_object('rejection_reason', reason)
+        )
+    )
     
-    if not receipt:
+    if not rejected:
+        if _receipt_status(receipt_id, uploader_id) == 'PROCESSED':
+            return jsonify({'message': 'Cannot reject a receipt that has already been processed.'}), 400
         return jsonify({'message': 'Receipt not found or you do not have permission to reject it.'}), 404
     
-    if receipt.status == 'PROCESSED':
-        return jsonify({'message': 'Cannot reject a receipt that has already been processed.'}), 400
-    
-    # Mark receipt as rejected and store the reason
-    receipt.status = 'REJECTED'
-    
-    # Store rejection reason in raw_ai_data if it exists, otherwise create new dict
-    if receipt.raw_ai_data:
-        receipt.raw_ai_data['rejection_reason'] = reason
-    else:
-        receipt.raw_ai_data = {'rejection_reason': reason}
-    
-    db.session.commit()
-    
     return jsonify({
         'message': 'Receipt rejected successfully.',
         'receipt_id': receipt_id,
@@ -464,34 +482,52 @@ def get_pending_receipts():
     pending_receipts = Receipt.query.filter_by(
         uploader_id=uploader_id,
         status='PENDING_CONFIRMATION'
-    ).order_by(Receipt.timestamp.desc()).all()
-    
-    # Format the response
-    result = []
-    for receipt in pending_receipts:
-        extracted_data = receipt.raw_ai_data or {}
-        result.append({
-            'receipt_id': receipt.id,
-            'image_url': receipt.image_url,
-            'timestamp': receipt.timestamp.isoformat() if receipt.timestamp else None,
-            'extracted_data': {
-                'vendor_name': extracted_data.get('vendor_name'),
-                'receipt_number': extracted_data.get('receipt_number'),
-                'total_amount': extracted_data.get('total_amount'),
-                'currency': extracted_data.get('currency', 'USD'),
-                'transaction_date': extracted_data.get('transaction_date'),
-                'payer_name': extracted_data.get('payer_name')
-            }
-        })
+    ).order_by(Receipt.timestamp.desc()).yield_per(500)
     
-    return jsonify({
-        'pending_receipts': result,
-        'count': len(result)
-    }), 200
+    return stream_json_list('pending_receipts', pending_receipts, _serialize_pending_receipt)
+
+
+def _serialize_pending_receipt(receipt):
+    """Format a pending Receipt row for the /pending response."""
+    extracted_data = receipt.raw_ai_data or {}
+    try:
+        extracted_data = ReceiptExtraction.model_validate(extracted_data).to_response()
+    except ValidationError:
+        # Legacy rows with mistyped fields: the response is already streaming,
+        # so return the raw values rather than cut the body short
+        extracted_data = {
+            'vendor_name': extracted_data.get('vendor_name'),
+            'receipt_number': extracted_data.get('receipt_number'),
+            'total_amount': extracted_data.get('total_amount'),
+            'currency': extracted_data.get('currency', 'USD'),
+            'transaction_date': extracted_data.get('transaction_date'),
+            'payer_name': extracted_data.get('payer_name')
+        }
+    return {
+        'receipt_id': receipt.id,
+        'image_url': receipt.image_url,
+        'timestamp': receipt.timestamp,
+        'extracted_data': extracted_data
+    }
 
 
 # ==================== MONGODB RECEIPT STORAGE ROUTES ====================
 
+def _mongo_json(value):
+    """
+    Format datetimes in MongoDB documents as HTTP dates, the format these
+    responses had under Flask's default JSON provider (orjson would emit
+    ISO 8601), so the /mongo/* API output is unchanged.
+    """
+    if isinstance(value, dict):
+        return {key: _mongo_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_mongo_json(item) for item in value]
+    if isinstance(value, (date, datetime)):
+        return http_date(value)
+    return value
+
+
 @bp.route('/mongo/<int:receipt_id>', methods=['GET'])
 @jwt_required()
 @role_required([UserRole.SYSTEM_ADMIN, UserRole.RECEIPT_LOGGER, UserRole.BASIC_USER])
@@ -522,7 +558,7 @@ def get_mongo_receipt(receipt_id):
         mongo_receipt['_id'] = str(mongo_receipt['_id'])
     
     return jsonify({
-        'receipt': mongo_receipt
+        'receipt': _mongo_json(mongo_receipt)
     }), 200
 
 
@@ -546,19 +582,14 @@ def get_user_mongo_receipts(user_id):
     # Limit maximum results
     limit = min(limit, 500)
     
-    receipts = ReceiptMongoService.get_user_receipts(
+    receipts = ReceiptMongoService.iter_user_receipts(
         uploader_id=user_id,
         include_archived=include_archived,
         limit=limit,
         skip=skip
     )
     
-    return jsonify({
-        'receipts': receipts,
-        'count': len(receipts),
-        'limit': limit,
-        'skip': skip
-    }), 200
+    return stream_json_list('receipts', receipts, _mongo_json, limit=limit, skip=skip)
 
 
 @bp.route('/mongo/archive/<int:receipt_id>', methods=['POST'])
@@ -636,15 +667,12 @@ def get_archived_receipts():
     # Filter by user unless admin
     user_id = None if g.current_user.role == UserRole.SYSTEM_ADMIN.value else g.current_user.id
     
-    receipts = ReceiptMongoService.get_archived_receipts(
+    receipts = ReceiptMongoService.iter_archived_receipts(
         uploader_id=user_id,
         days_old=days_old
     )
     
-    return jsonify({
-        'archived_receipts': receipts,
-        'count': len(receipts)
-    }), 200
+    return stream_json_list('archived_receipts', receipts, _mongo_json)
 
 
 @bp.route('/mongo/stats', methods=['GET'])
@@ -672,7 +700,7 @@ def get_receipt_stats():
     stats = ReceiptMongoService.get_receipt_stats(uploader_id=user_id)
     
     return jsonify({
-        'stats': stats
+        'stats': _mongo_json(stats)
     }), 200
 
 
@@ -699,7 +727,7 @@ def search_mongo_receipts():
     )
     
     return jsonify({
-        'results': receipts,
+        'results': _mongo_json(receipts),
         'count': len(receipts),
         'query': query_text
     }), 200
@@ -0,0 +1,121 @@
+# app/schemas.py
+
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+from pydantic import BaseModel, Field, ValidationError, field_serializer, field_validator
+
+
+class ConfirmPayload(BaseModel):
+    """
+    Request body for POST /api/receipts/confirm.
+    Pydantic parses total_amount straight into a Decimal and transaction_date
+    into a date, replacing the hand-rolled required-field and format checks.
+    """
+    model_config = {
+        'coerce_numbers_to_str': True,  # AI-extracted receipt numbers are sometimes numeric
+        'json_schema_extra': {
+            'example': {
+                'receipt_id': 123,
+                'vendor_name': 'Store Name',
+                'receipt_number': 'INV-12345',
+                'total_amount': 45.99,
+                'currency': 'USD',
+                'transaction_date': '2024-12-05',
+                'payer_name': 'John Doe'
+            }
+        }
+    }
+    
+    receipt_id: int
+    vendor_name: str = Field(min_length=1)
+    total_amount: Decimal
+    transaction_date: date
+    receipt_number: Optional[str] = None
+    currency: str = 'USD'
+    payer_name: Optional[str] = None
+    description: Optional[str] = None
+    
+    @field_validator('currency', mode='before')
+    @classmethod
+    def default_currency(cls, value):
+        """Treat an explicit null/empty currency as USD."""
+        return value or 'USD'
+
+
+_EXTRACTION_RESPONSE_FIELDS = {'vendor_name', 'receipt_number', 'total_amount', 'currency', 'transaction_date', 'payer_name'}
+_EXTRACTION_METADATA_FIELDS = {'vendor_name', 'total_amount', 'currency', 'transaction_date', 'receipt_number'}
+
+
+class ReceiptExtraction(BaseModel):
+    """
+    Normalized view of the fields Gemini extracts from a receipt.
+    Parse the raw AI output once and reuse the typed object for the
+    database, MongoDB metadata and API responses.
+    """
+    model_config = {'coerce_numbers_to_str': True}
+    
+    vendor_name: Optional[str] = None
+    receipt_number: Optional[str] = None
+    total_amount: Optional[Decimal] = None
+    currency: str = 'USD'
+    transaction_date: Optional[date] = None
+    payer_name: Optional[str] = None
+    
+    @field_validator('currency', mode='before')
+    @classmethod
+    def default_currency(cls, value):
+        """Treat a missing/empty currency as USD."""
+        return value or 'USD'
+    
+    @field_validator('total_amount', 'transaction_date', mode='wrap')
+    @classmethod
+    def drop_unparseable(cls, value, handler):
+        """AI output is best-effort: keep unparseable amounts/dates as null for the user to fill in."""
+        try:
+            return handler(value)
+        except ValueError:
+            return None
+    
+    @field_validator('transaction_date', mode='before')
+    @classmethod
+    def date_from_datetime(cls, value):
+        """Gemini often returns a full timestamp ('2024-01-05T10:00:00'): keep its date."""
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, str) and len(value.strip()) > 10:
+            try:
+                return datetime.fromisoformat(value.strip().replace('Z', '+00:00')).date()
+            except ValueError:
+                pass
+        return value
+    
+    @field_serializer('total_amount')
+    def serialize_amount(self, value):
+        return float(value) if value is not None else None
+    
+    def to_response(self):
+        """Fields returned to the client for review/confirmation."""
+        return self.model_dump(mode='json', include=_EXTRACTION_RESPONSE_FIELDS)
+    
+    def to_metadata(self):
+        """Fields stored as MongoDB receipt metadata."""
+        return self.model_dump(mode='json', include=_EXTRACTION_METADATA_FIELDS)
+
+
+def validation_error_message(error: ValidationError):
+    """
+    Build the API error message for a failed payload validation.
+    Missing/empty fields are reported together, other errors as a format problem.
+    """
+    missing = [
+        str(err['loc'][0]) for err in error.errors()
+        if err['type'] in ('missing', 'string_too_short')
+    ]
+    if missing:
+        return f'Missing required fields: {", ".join(missing)}'
+    
+    details = '; '.join(
+        f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in error.errors()
+    )
+    return f'Invalid data format: {details}'
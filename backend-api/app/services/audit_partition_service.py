@@ -0,0 +1,144 @@
+# app/services/audit_partition_service.py
+
+from app import db
+from datetime import date
+from sqlalchemy import text
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+AUDIT_TABLE = 'audit_logs'
+DEFAULT_PARTITION = 'audit_logs_default'
+_PARTITION_NAME = re.compile(r'^audit_logs_(\d{4})_(\d{2})$')
+
+
+def _add_months(month_start, months):
+    """Return the first day of the month `months` after month_start."""
+    index = month_start.year * 12 + (month_start.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class AuditPartitionService:
+    """
+    Service for maintaining monthly RANGE partitions of the audit_logs table.
+    
+    Once audit_logs has been converted (see migrate_partition_audit_logs.py),
+    each month lives in its own partition (audit_logs_YYYY_MM). Timestamp-bounded
+    queries only scan the matching partitions, and retention becomes a
+    DETACH + DROP of whole months instead of a DELETE followed by VACUUM.
+    """
+    
+    @staticmethod
+    def partition_name(month_start):
+        """Get the partition table name for a month."""
+        return f"{AUDIT_TABLE}_{month_start.year:04d}_{month_start.month:02d}"
+    
+    @staticmethod
+    def is_partitioned(connection=None):
+        """Check whether audit_logs is a partitioned table."""
+        connection = connection or db.session
+        return connection.execute(text(
+            "SELECT 1 FROM pg_partitioned_table p "
+            "JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = :table AND c.relnamespace = 'public'::regnamespace"
+        ), {'table': AUDIT_TABLE}).first() is not None
+    
+    @staticmethod
+    def create_month_partition(month_start, connection=None):
+        """
+        Create the partition for the month starting at month_start (if missing).
+        
+        Args:
+            month_start (date): First day of the month
+            connection: Connection/session to execute on (defaults to db.session)
+        """
+        connection = connection or db.session
+        name = AuditPartitionService.partition_name(month_start)
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {AUDIT_TABLE} "
+            f"FOR VALUES FROM ('{month_start.isoformat()}') TO ('{_add_months(month_start, 1).isoformat()}')"
+        ))
+        return name
+    
+    @staticmethod
+    def create_default_partition(connection=None):
+        """Create the catch-all partition for rows outside the monthly partitions."""
+        connection = connection or db.session
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {AUDIT_TABLE} DEFAULT"
+        ))
+    
+    @staticmethod
+    def get_month_partitions(connection=None):
+        """
+        List the monthly partitions of audit_logs.
+        
+        Returns:
+            list: (partition name, month start date) tuples, oldest first
+        """
+        connection = connection or db.session
+        rows = connection.execute(text(
+            "SELECT child.relname FROM pg_inherits i "
+            "JOIN pg_class parent ON parent.oid = i.inhparent "
+            "JOIN pg_class child ON child.oid = i.inhrelid "
+            "WHERE parent.relname = :table"
+        ), {'table': AUDIT_TABLE}).scalars()
+        
+        partitions = []
+        for name in rows:
+            match = _PARTITION_NAME.match(name)
+            if match:
+                partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+        
+        return sorted(partitions, key=lambda p: p[1])
+    
+    @staticmethod
+    def maintain_partitions(months_ahead=2, retention_months=0):
+        """
+        Pre-create upcoming monthly partitions and drop expired ones.
+        Does nothing if audit_logs is not partitioned.
+        
+        Args:
+            months_ahead (int): Number of future months to create partitions for
+            retention_months (int): Keep this many months (including the current one);
+                0 keeps everything
+        
+        Returns:
+            dict: Created and dropped partition names
+        """
+        result = {'created': [], 'dropped': []}
+        
+        try:
+            if not AuditPartitionService.is_partitioned():
+                return result
+            
+            current_month = date.today().replace(day=1)
+            existing = {name for name, _ in AuditPartitionService.get_month_partitions()}
+            
+            for offset in range(months_ahead + 1):
+                month_start = _add_months(current_month, offset)
+                name = AuditPartitionService.partition_name(month_start)
+                if name not in existing:
+                    AuditPartitionService.create_month_partition(month_start)
+                    result['created'].append(name)
+            
+            if retention_months:
+                cutoff = _add_months(current_month, -(retention_months - 1))
+                for name, month_start in AuditPartitionService.get_month_partitions():
+                    if month_start < cutoff:
+                        db.session.execute(text(f"ALTER TABLE {AUDIT_TABLE} DETACH PARTITION {name}"))
+                        db.session.execute(text(f"DROP TABLE {name}"))
+                        result['dropped'].append(name)
+            
+            db.session.commit()
+            
+            if result['created'] or result['dropped']:
+                logger.info(f"Audit log partitions created: {result['created']}, dropped: {result['dropped']}")
+            
+            return result
+        
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error maintaining audit log partitions: {e}")
+            raise
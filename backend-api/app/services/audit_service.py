@@ -2,9 +2,252 @@
 
 from app import db
 from app.models import AuditLog
-from flask import request, g
-from datetime import datetime
-from sqlalchemy import and_, or_
+from app.json_provider import dumps_bytes
+from flask import request, g, has_request_context, has_app_context
+from datetime import datetime, date, time as dt_time, timedelta, timezone
+from sqlalchemy import and_, or_, tuple_, func, insert
+from sqlalchemy.orm import load_only
+import atexit
+import csv
+import io
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# NULL marker for the CSV COPY path (PostgreSQL's text-format default)
+COPY_NULL = '\\N'
+
+
+class AuditLogWriter:
+    """
+    Background writer that batches audit log inserts.
+    
+    log_action puts row mappings on a bounded in-process queue; a small fixed
+    set of daemon threads drains it and inserts each batch with a single commit,
+    so audit writes no longer add a commit to every API request.
+    
+    Under a burst the queue, not the thread count, absorbs the backlog. When it
+    is full a request waits at most ENQUEUE_TIMEOUT for room, then the entry is
+    handed back to log_action, which writes it with the request instead (counted,
+    see overflow_count): audit rows are the security trail, so a slow request is
+    preferred over a gap.
+    """
+    
+    MAX_QUEUE_SIZE = 20000
+    BATCH_SIZE = 500
+    FLUSH_INTERVAL = 0.5  # seconds
+    ENQUEUE_TIMEOUT = 0.05  # seconds
+    WORKERS = 2
+    
+    _queue = queue.Queue(maxsize=MAX_QUEUE_SIZE)
+    _threads = []
+    _app = None
+    _overflowed = 0
+    _overflowed_lock = threading.Lock()
+    _failed = 0
+    _failed_lock = threading.Lock()
+    
+    @classmethod
+    def initialize(cls, app):
+        """Start the writer threads for the given Flask app."""
+        if cls.is_running():
+            return
+        
+        cls._app = app
+        cls._threads = [
+            threading.Thread(target=cls._run, name=f'audit-log-writer-{i}', daemon=True)
+            for i in range(cls.WORKERS)
+        ]
+        for thread in cls._threads:
+            thread.start()
+        
+        # Write whatever is still queued when the process exits
+        atexit.register(cls.flush)
+        
+        logger.info(f"Audit log writer started ({cls.WORKERS} threads)")
+    
+    @classmethod
+    def is_running(cls):
+        """Check whether the writer threads are available."""
+        return any(thread.is_alive() for thread in cls._threads)
+    
+    @classmethod
+    def enqueue(cls, entry):
+        """
+        Queue an audit log row mapping for a batched insert.
+        
+        Returns:
+            bool: True once the entry is queued; False if the writer is not
+            running or the queue stayed full, in which case the caller must
+            write the entry itself
+        """
+        if not cls.is_running():
+            return False
+        
+        try:
+            cls._queue.put(entry, timeout=cls.ENQUEUE_TIMEOUT)
+        except queue.Full:
+            with cls._overflowed_lock:
+                cls._overflowed += 1
+                overflowed = cls._overflowed
+            # Log the first overflow and then every 1000th, not every request
+            if overflowed % 1000 == 1:
+                logger.warning(f"Audit log queue full, {overflowed} entries written synchronously so far")
+            return False
+        return True
+    
+    @classmethod
+    def overflow_count(cls):
+        """Number of audit entries written by the caller because the queue was full."""
+        return cls._overflowed
+    
+    @classmethod
+    def failed_count(cls):
+        """Number of audit entries the writer could not insert."""
+        return cls._failed
+    
+    @classmethod
+    def _record_failure(cls, count):
+        """Add count entries to the write failure total."""
+        with cls._failed_lock:
+            cls._failed += count
+    
+    @classmethod
+    def _next_batch(cls):
+        """Collect up to BATCH_SIZE entries, waiting at most FLUSH_INTERVAL after the first."""
+        batch = [cls._queue.get()]
+        deadline = time.monotonic() + cls.FLUSH_INTERVAL
+        
+        while len(batch) < cls.BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(cls._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        
+        return batch
+    
+    @classmethod
+    def _run(cls):
+        """Writer thread loop; a failed batch is logged and counted, never fatal."""
+        while True:
+            batch = cls._next_batch()
+            try:
+                with cls._app.app_context():
+                    cls._write(batch)
+            except Exception as e:
+                # e.g. the database is unreachable: keep the thread alive for
+                # the next batch instead of silently losing the writer
+                cls._record_failure(len(batch))
+                logger.exception(f"Audit log writer failed to write {len(batch)} rows: {e}")
+            finally:
+                for _ in batch:
+                    cls._queue.task_done()
+    
+    @staticmethod
+    def _copy_rows(connection, batch):
+        """
+        Load a batch with PostgreSQL COPY ... FROM STDIN (CSV) on the connection's
+        psycopg2 cursor: one streamed statement, no per-row bind/execute.
+        Rows keep the event timestamp set by log_action; COPY skips Python
+        column defaults, so one is filled in here only for entries without it.
+        id takes its server default.
+        """
+        columns = list(batch[0])
+        if 'timestamp' not in columns:
+            columns.append('timestamp')
+        timestamp_index = columns.index('timestamp')
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        
+        for entry in batch:
+            row = [entry.get(column) for column in columns]
+            if row[timestamp_index] is None:
+                row[timestamp_index] = datetime.utcnow()
+            metadata = entry.get('request_metadata')
+            if metadata is not None:
+                row[columns.index('request_metadata')] = dumps_bytes(metadata).decode('utf-8')
+            # Explicit NULL marker: csv writes None and '' alike, and empty
+            # strings must stay '' as they do through INSERT
+            writer.writerow([COPY_NULL if value is None else value for value in row])
+        
+        buffer.seek(0)
+        sql = (
+            f"COPY {AuditLog.__tablename__} ({', '.join(columns)}) "
+            f"FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')"
+        )
+        with connection.connection.cursor() as cursor:
+            cursor.copy_expert(sql, buffer)
+    
+    @classmethod
+    def _write(cls, batch):
+        """
+        Insert a batch in one statement - COPY on PostgreSQL, executemany
+        elsewhere - falling back to row-by-row on failure. Uses a pooled Core
+        connection directly: no ORM session or unit of work is involved in
+        writing plain row mappings.
+        """
+        AuditService.bound_metadata(batch)
+        
+        try:
+            with db.engine.begin() as connection:
+                if connection.dialect.name == 'postgresql':
+                    cls._copy_rows(connection, batch)
+                else:
+                    connection.execute(insert(AuditLog), batch)
+            return
+        except Exception as e:
+            logger.error(f"Batch audit log insert failed, retrying {len(batch)} rows individually: {e}")
+        
+        # One bad row should not drop the rest of the batch
+        with db.engine.connect() as connection:
+            for entry in batch:
+                try:
+                    with connection.begin():
+                        connection.execute(insert(AuditLog), [entry])
+                except Exception as e:
+                    cls._record_failure(1)
+                    logger.error(f"Error creating audit log: {e}")
+    
+    @classmethod
+    def flush(cls):
+        """Synchronously write everything currently queued (used at shutdown)."""
+        if cls._app is None:
+            return
+        
+        batch = []
+        while True:
+            try:
+                batch.append(cls._queue.get_nowait())
+            except queue.Empty:
+                break
+        
+        if batch:
+            try:
+                with cls._app.app_context():
+                    cls._write(batch)
+            finally:
+                for _ in batch:
+                    cls._queue.task_done()
+    
+    @classmethod
+    def wait_until_idle(cls, timeout=5.0):
+        """
+        Wait until every queued entry has been written, including batches the
+        writer threads are inserting right now (for scripts and shutdown checks).
+        
+        Returns:
+            bool: True if the writer caught up within timeout seconds
+        """
+        deadline = time.monotonic() + timeout
+        while cls._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return not cls._queue.unfinished_tasks
 
 
 class AuditService:
@@ -13,6 +256,68 @@ class AuditService:
     Provides methods to log user actions, API calls, and query audit history.
     """
     
+    # Larger metadata payloads are replaced by a size marker
+    MAX_METADATA_BYTES = 4096
+    
+    @staticmethod
+    def parse_timestamp(value):
+        """
+        Normalize a date/time filter value to what audit_logs.timestamp stores.
+        
+        Timestamps are naive UTC, so aware datetimes are converted to naive UTC
+        (comparing against an aware value would cast the column and skip its
+        indexes). A date-only value ('YYYY-MM-DD' or a date) is returned as a date
+        so range filters can treat it as a whole day.
+        
+        Args:
+            value (str | date | datetime): ISO string, date, or datetime
+        
+        Returns:
+            date | datetime: Parsed value, or None if value is empty
+        
+        Raises:
+            ValueError: If a string is not in ISO format
+        """
+        if not value:
+            return None
+        
+        if isinstance(value, str):
+            value = value.strip()
+            if len(value) == 10:
+                return date.fromisoformat(value)
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        
+        if isinstance(value, datetime) and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        
+        return value
+    
+    @staticmethod
+    def _timestamp_range_filters(start_date=None, end_date=None):
+        """
+        Build sargable predicates on AuditLog.timestamp.
+        
+        Compares the bare column against plain datetimes (never wrap the column
+        in a function such as func.date(), which disables its indexes). A date-only
+        end_date becomes the half-open bound timestamp < end_date + 1 day.
+        """
+        start_date = AuditService.parse_timestamp(start_date)
+        end_date = AuditService.parse_timestamp(end_date)
+        filters = []
+        
+        if start_date:
+            if not isinstance(start_date, datetime):
+                start_date = datetime.combine(start_date, dt_time.min)
+            filters.append(AuditLog.timestamp >= start_date)
+        
+        if end_date:
+            if isinstance(end_date, datetime):
+                filters.append(AuditLog.timestamp <= end_date)
+            else:
+                filters.append(AuditLog.timestamp < datetime.combine(end_date, dt_time.min) + timedelta(days=1))
+        
+        return filters
+    
     @staticmethod
     def log_action(
         action,
@@ -52,50 +357,79 @@ class AuditService:
             session_id (str): Session identifier
         
         Returns:
-            AuditLog: The created audit log entry
+            AuditLog: The created audit log entry, or None if it was queued for the
+            background writer (see AuditLogWriter), buffered until the end of the
+            request (see flush_request_buffer) or could not be created
         """
         try:
             # Auto-populate from Flask request context if available
-            if not method and request:
-                method = request.method
+            # (resolve the request proxy once; skip entirely in background jobs)
+            if has_request_context():
+                req = request._get_current_object()
+                headers = req.headers
+                
+                if not method:
+                    method = req.method
+                
+                if not endpoint:
+                    endpoint = req.path
+                
+                if not ip_address:
+                    # Get real IP if behind proxy
+                    ip_address = headers.get('X-Forwarded-For', req.remote_addr)
+                    if ip_address and ',' in ip_address:
+                        ip_address = ip_address.split(',')[0].strip()
+                
+                if not user_agent:
+                    user_agent = headers.get('User-Agent', '')[:512]
+            
+            # Try to get user from Flask g context if not provided (the plain
+            # copies jwt_required stores; g.current_user may have been expired
+            # by a commit in the handler, and reading it would reload the row)
+            if not user_id and has_app_context():
+                user_id = g.get('uid')
+                if user_id:
+                    username = username or g.uname
+                    user_role = user_role or g.urole
             
-            if not endpoint and request:
-                endpoint = request.path
+            # Serialization (and the size bound) happens where the entry is
+            # written; copy so later changes by the caller are not recorded
+            if metadata:
+                metadata = dict(metadata)
             
-            if not ip_address and request:
-                # Get real IP if behind proxy
-                ip_address = request.headers.get('X-Forwarded-For', request.remote_addr)
-                if ip_address and ',' in ip_address:
-                    ip_address = ip_address.split(',')[0].strip()
+            entry = {
+                'user_id': user_id,
+                'username': username,
+                'user_role': user_role,
+                'action': action,
+                'resource_type': resource_type,
+                'resource_id': resource_id,
+                'method': method,
+                'endpoint': endpoint,
+                'ip_address': ip_address,
+                'user_agent': user_agent,
+                'status_code': status_code,
+                'success': success,
+                'error_message': error_message,
+                'request_metadata': metadata,
+                'session_id': session_id,
+                # Stamped at the event, not when the writer or teardown inserts it
+                'timestamp': datetime.utcnow()
+            }
             
-            if not user_agent and request:
-                user_agent = request.headers.get('User-Agent', '')[:512]
+            # Hand off to the batch writer
+            if AuditLogWriter.enqueue(entry):
+                return None
             
-            # Try to get user from Flask g context if not provided
-            if not user_id and hasattr(g, 'current_user') and g.current_user:
-                user_id = g.current_user.id
-                username = username or g.current_user.username
-                user_role = user_role or g.current_user.role
+            # Without the writer (or with its queue full), coalesce a request's
+            # entries into one insert at teardown
+            if has_request_context():
+                g.setdefault('audit_buffer', []).append(entry)
+                return None
             
             # Create audit log entry
-            audit_log = AuditLog(
-                user_id=user_id,
-                username=username,
-                user_role=user_role,
-                action=action,
-                resource_type=resource_type,
-                resource_id=resource_id,
-                method=method,
-                endpoint=endpoint,
-                ip_address=ip_address,
-                user_agent=user_agent,
-                timestamp=datetime.utcnow(),
-                status_code=status_code,
-                success=success,
-                error_message=error_message,
-                request_metadata=metadata,
-                session_id=session_id
-            )
+            AuditService.bound_metadata([entry])
+            audit_log = AuditLog(**entry)
             
             db.session.add(audit_log)
             db.session.commit()
@@ -105,13 +439,51 @@ class AuditService:
         except Exception as e:
             # Don't let audit logging break the application
             # Log the error but don't raise
-            print(f"Error creating audit log: {e}")
+            logger.exception(f"Error creating audit log: {e}")
             try:
                 db.session.rollback()
             except:
                 pass
             return None
     
+    @staticmethod
+    def bound_metadata(entries):
+        """
+        Replace oversized request_metadata in audit row mappings with a size
+        marker (callers may pass whole request bodies). Runs wherever the rows
+        are inserted - on the writer thread when AuditLogWriter is running -
+        so request threads do not pay for encoding metadata.
+        
+        Args:
+            entries (list): Row mappings, modified in place
+        """
+        for entry in entries:
+            metadata = entry.get('request_metadata')
+            if not metadata:
+                continue
+            size = len(dumps_bytes(metadata))
+            if size > AuditService.MAX_METADATA_BYTES:
+                entry['request_metadata'] = {'_truncated': True, '_size': size, '_keys': sorted(map(str, metadata))[:50]}
+    
+    @staticmethod
+    def flush_request_buffer(exc=None):
+        """
+        Insert the audit entries buffered during this request in one statement.
+        Registered as a teardown_request handler; uses its own connection so the
+        request session's state (committed or not) is left alone.
+        """
+        buffer = g.pop('audit_buffer', None)
+        if not buffer:
+            return
+        
+        AuditService.bound_metadata(buffer)
+        
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(insert(AuditLog), buffer)
+        except Exception as e:
+            logger.exception(f"Error writing {len(buffer)} buffered audit logs: {e}")
+    
     @staticmethod
     def log_authentication(action, username, success, error_message=None, metadata=None):
         """
@@ -160,7 +532,10 @@ class AuditService:
         success=None,
         limit=100,
         offset=0,
-        order_by='desc'
+        order_by='desc',
+        after_timestamp=None,
+        after_id=None,
+        summary=False
     ):
         """
         Query audit logs with filters.
@@ -169,18 +544,28 @@ class AuditService:
             user_id (int): Filter by user ID
             action (str): Filter by action type
             resource_type (str): Filter by resource type
-            start_date (datetime): Filter logs after this date
-            end_date (datetime): Filter logs before this date
+            start_date (datetime | date | str): Filter logs after this date
+            end_date (datetime | date | str): Filter logs before this date (a date includes the whole day)
             success (bool): Filter by success status
             limit (int): Maximum number of logs to return
             offset (int): Number of logs to skip (pagination)
             order_by (str): 'asc' or 'desc' for timestamp ordering
+            after_timestamp (datetime): Keyset cursor - timestamp of the last log on the previous page
+            after_id (int): Keyset cursor - id of the last log on the previous page
+            summary (bool): Only load AuditLog.SUMMARY_COLUMNS (use to_summary_dict);
+                lets PostgreSQL answer from the covering index without heap fetches
         
         Returns:
             list: List of AuditLog objects
+        
+        Pass the (timestamp, id) of the last returned log as after_timestamp/after_id
+        to fetch the next page; unlike offset, this stays fast on deep pages.
         """
         query = AuditLog.query
         
+        if summary:
+            query = query.options(load_only(*[getattr(AuditLog, column) for column in AuditLog.SUMMARY_COLUMNS]))
+        
         # Apply filters
         if user_id is not None:
             query = query.filter(AuditLog.user_id == user_id)
@@ -191,23 +576,29 @@ class AuditService:
         if resource_type:
             query = query.filter(AuditLog.resource_type == resource_type)
         
-        if start_date:
-            query = query.filter(AuditLog.timestamp >= start_date)
-        
-        if end_date:
-            query = query.filter(AuditLog.timestamp <= end_date)
+        query = query.filter(*AuditService._timestamp_range_filters(start_date, end_date))
         
         if success is not None:
             query = query.filter(AuditLog.success == success)
         
-        # Order by timestamp
+        # Order by timestamp, with id as a tie-breaker so the keyset cursor is unique
+        cursor = tuple_(AuditLog.timestamp, AuditLog.id)
+        after_timestamp = AuditService.parse_timestamp(after_timestamp)
+        after = after_timestamp is not None and after_id is not None
+        
         if order_by.lower() == 'desc':
-            query = query.order_by(AuditLog.timestamp.desc())
+            if after:
+                query = query.filter(cursor < tuple_(after_timestamp, after_id))
+            query = query.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc())
         else:
-            query = query.order_by(AuditLog.timestamp.asc())
+            if after:
+                query = query.filter(cursor > tuple_(after_timestamp, after_id))
+            query = query.order_by(AuditLog.timestamp.asc(), AuditLog.id.asc())
         
         # Apply pagination
-        query = query.limit(limit).offset(offset)
+        query = query.limit(limit)
+        if offset:
+            query = query.offset(offset)
         
         return query.all()
     
@@ -241,8 +632,6 @@ class AuditService:
         Returns:
             list: List of failed login attempts
         """
-        from datetime import timedelta
-        
         cutoff_time = datetime.utcnow() - timedelta(hours=hours)
         
         query = AuditLog.query.filter(
@@ -281,29 +670,23 @@ class AuditService:
         Get audit log statistics.
         
         Args:
-            start_date (datetime): Start date for statistics
-            end_date (datetime): End date for statistics
+            start_date (datetime | date | str): Start date for statistics
+            end_date (datetime | date | str): End date for statistics (a date includes the whole day)
         
         Returns:
             dict: Statistics about audit logs
         """
-        query = AuditLog.query
-        
-        if start_date:
-            query = query.filter(AuditLog.timestamp >= start_date)
-        
-        if end_date:
-            query = query.filter(AuditLog.timestamp <= end_date)
+        # Single round-trip: all counters computed in one scan of the filtered rows
+        query = db.session.query(
+            func.count(AuditLog.id),
+            func.count(AuditLog.id).filter(AuditLog.success.is_(True)),
+            func.count(AuditLog.id).filter(AuditLog.success.is_(False)),
+            func.count(func.distinct(AuditLog.user_id))
+        )
         
-        total_logs = query.count()
-        successful_actions = query.filter(AuditLog.success == True).count()
-        failed_actions = query.filter(AuditLog.success == False).count()
+        query = query.filter(*AuditService._timestamp_range_filters(start_date, end_date))
         
-        # Get unique users
-        unique_users = db.session.query(AuditLog.user_id)\
-            .filter(AuditLog.user_id.isnot(None))\
-            .distinct()\
-            .count()
+        total_logs, successful_actions, failed_actions, unique_users = query.one()
         
         return {
             'total_logs': total_logs,
@@ -2,12 +2,26 @@
 
 from app.models import Currency, ExchangeRate, db
 from datetime import datetime, timedelta
-from sqlalchemy import desc
+from decimal import Decimal, ROUND_HALF_EVEN
+from sqlalchemy import desc, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from cachetools import TTLCache
+from app.http_session import http_session
 import requests
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
+# Latest rate per currency code. Rates change every 12 hours, so a short TTL
+# keeps other workers reasonably fresh; update_exchange_rates clears it locally.
+_rate_cache = TTLCache(maxsize=256, ttl=600)
+_rate_cache_lock = threading.Lock()
+
+# Rounding for converted amounts and reported rates
+CENT = Decimal('0.01')
+RATE_PLACES = Decimal('0.000001')
+
 # Currency catalog with common currencies including Philippine Peso
 CURRENCY_CATALOG = [
     {'code': 'USD', 'name': 'United States Dollar', 'symbol': '$'},
@@ -46,20 +60,13 @@ class CurrencyService:
         Initialize the currency catalog in the database.
         Only adds currencies that don't already exist.
         """
-        added_count = 0
-        for currency_data in CURRENCY_CATALOG:
-            existing = Currency.query.filter_by(code=currency_data['code']).first()
-            if not existing:
-                currency = Currency(
-                    code=currency_data['code'],
-                    name=currency_data['name'],
-                    symbol=currency_data['symbol'],
-                    is_active=True
-                )
-                db.session.add(currency)
-                added_count += 1
+        # Single INSERT ... ON CONFLICT (code) DO NOTHING instead of a lookup per currency
+        statement = pg_insert(Currency)\
+            .values([dict(currency_data, is_active=True) for currency_data in CURRENCY_CATALOG])\
+            .on_conflict_do_nothing(index_elements=['code'])
         
         try:
+            added_count = db.session.execute(statement).rowcount
             db.session.commit()
             logger.info(f"Currency initialization complete. Added {added_count} new currencies.")
             return added_count
@@ -91,7 +98,7 @@ class CurrencyService:
         try:
             # Using exchangerate-api.com with USD as base
             url = "https://api.exchangerate-api.com/v4/latest/USD"
-            response = requests.get(url, timeout=10)
+            response = http_session.get(url, timeout=10)
             response.raise_for_status()
             
             data = response.json()
@@ -116,15 +123,20 @@ class CurrencyService:
             logger.warning("Could not fetch exchange rates, skipping update")
             return False
         
-        updated_count = 0
         timestamp = datetime.utcnow()
         
-        # Get all active currencies
-        currencies = Currency.query.filter_by(is_active=True).all()
+        # Codes of all active currencies (no need to load whole Currency rows)
+        codes = db.session.scalars(select(Currency.code).where(Currency.is_active.is_(True))).all()
         
-        for currency in currencies:
-            code = currency.code
-            
+        # Currencies that already have a recent rate (within last 11 hours), in one query
+        recent_codes = {
+            code for (code,) in db.session.query(ExchangeRate.currency_code)
+            .filter(ExchangeRate.timestamp > timestamp - timedelta(hours=11))
+            .distinct()
+        }
+        
+        rows = []
+        for code in codes:
             # USD to USD is always 1.0
             if code == 'USD':
                 rate_from_usd = 1.0
@@ -138,29 +150,26 @@ class CurrencyService:
                 logger.warning(f"No rate found for {code}, skipping")
                 continue
             
-            # Check if we already have a recent rate (within last 11 hours)
-            recent_rate = ExchangeRate.query.filter_by(currency_code=code)\
-                .filter(ExchangeRate.timestamp > timestamp - timedelta(hours=11))\
-                .order_by(desc(ExchangeRate.timestamp))\
-                .first()
-            
-            if recent_rate:
+            if code in recent_codes:
                 logger.info(f"Recent rate exists for {code}, skipping")
                 continue
             
-            # Create new exchange rate entry
-            exchange_rate = ExchangeRate(
-                currency_code=code,
-                rate_to_usd=rate_to_usd,
-                rate_from_usd=rate_from_usd,
-                timestamp=timestamp,
-                source='exchangerate-api'
-            )
-            db.session.add(exchange_rate)
-            updated_count += 1
+            rows.append({
+                'currency_code': code,
+                'rate_to_usd': rate_to_usd,
+                'rate_from_usd': rate_from_usd,
+                'timestamp': timestamp,
+                'source': 'exchangerate-api'
+            })
+        
+        updated_count = len(rows)
         
         try:
+            # One executemany INSERT for all new rates (no ORM objects to flush)
+            if rows:
+                db.session.execute(insert(ExchangeRate), rows)
             db.session.commit()
+            CurrencyService.clear_rate_cache()
             logger.info(f"Exchange rate update complete. Updated {updated_count} rates.")
             return True
         except Exception as e:
@@ -170,24 +179,62 @@ class CurrencyService:
     
     @staticmethod
     def get_latest_rate(currency_code):
-        """Get the most recent exchange rate for a currency."""
-        return ExchangeRate.query.filter_by(currency_code=currency_code)\
+        """
+        Get the most recent exchange rate for a currency.
+        
+        Results are cached per process for a few minutes. The returned object is
+        a detached copy, so treat it as read-only.
+        """
+        with _rate_cache_lock:
+            cached = _rate_cache.get(currency_code)
+        if cached is not None:
+            return cached
+        
+        latest_rate = ExchangeRate.query.filter_by(currency_code=currency_code)\
             .order_by(desc(ExchangeRate.timestamp))\
             .first()
+        
+        if not latest_rate:
+            return None
+        
+        # Cache a plain copy rather than the session-bound instance, which would
+        # be expired by the next commit and unusable after the session closes
+        snapshot = ExchangeRate(
+            id=latest_rate.id,
+            currency_code=latest_rate.currency_code,
+            rate_to_usd=latest_rate.rate_to_usd,
+            rate_from_usd=latest_rate.rate_from_usd,
+            timestamp=latest_rate.timestamp,
+            source=latest_rate.source
+        )
+        with _rate_cache_lock:
+            _rate_cache[currency_code] = snapshot
+        return snapshot
+    
+    @staticmethod
+    def clear_rate_cache():
+        """Drop cached latest rates (called after new rates are committed)."""
+        with _rate_cache_lock:
+            _rate_cache.clear()
     
     @staticmethod
     def get_latest_rates_for_all_currencies():
         """Get the most recent exchange rate for each active currency."""
-        currencies = Currency.query.filter_by(is_active=True).all()
-        rates = {}
+        # One query: DISTINCT ON keeps the newest rate per currency code
+        # (served by the currency_code/timestamp index on exchange_rates)
+        latest = db.session.query(Currency, ExchangeRate)\
+            .join(ExchangeRate, ExchangeRate.currency_code == Currency.code)\
+            .filter(Currency.is_active.is_(True))\
+            .distinct(ExchangeRate.currency_code)\
+            .order_by(ExchangeRate.currency_code, desc(ExchangeRate.timestamp))\
+            .all()
         
-        for currency in currencies:
-            latest_rate = CurrencyService.get_latest_rate(currency.code)
-            if latest_rate:
-                rates[currency.code] = {
-                    'currency': currency.to_dict(),
-                    'rate': latest_rate.to_dict()
-                }
+        rates = {}
+        for currency, latest_rate in latest:
+            rates[currency.code] = {
+                'currency': currency.to_dict(),
+                'rate': latest_rate.to_dict()
+            }
         
         return rates
     
@@ -198,16 +245,19 @@ class CurrencyService:
         Always converts through USD as the base currency.
         
         Args:
-            amount: The amount to convert
+            amount: The amount to convert (Decimal, int, float or numeric string)
             from_currency: Source currency code
             to_currency: Target currency code
             
         Returns:
-            tuple: (converted_amount, rate_used, timestamp)
+            tuple: (converted_amount, rate_used, timestamp) - amount as Decimal
+            rounded to cents, rate as Decimal rounded to 6 places
         """
+        amount = CurrencyService._to_decimal(amount)
+        
         # If same currency, no conversion needed
         if from_currency == to_currency:
-            return (amount, 1.0, datetime.utcnow())
+            return (amount, Decimal('1'), datetime.utcnow())
         
         # Get latest rates for both currencies
         from_rate = CurrencyService.get_latest_rate(from_currency)
@@ -216,23 +266,72 @@ class CurrencyService:
         if not from_rate or not to_rate:
             raise ValueError(f"Exchange rate not found for {from_currency} or {to_currency}")
         
-        # Convert to USD first, then to target currency
-        amount_in_usd = float(amount) * float(from_rate.rate_to_usd)
-        converted_amount = amount_in_usd * float(to_rate.rate_from_usd)
-        
-        # Calculate the effective rate
-        rate_used = float(to_rate.rate_from_usd) / float(from_rate.rate_to_usd) if float(from_rate.rate_to_usd) != 0 else 0
+        converted_amount, rate_used = CurrencyService._convert_with_rates(amount, from_rate, to_rate)
         
         # Use the older timestamp of the two rates
         timestamp = min(from_rate.timestamp, to_rate.timestamp)
         
-        return (round(converted_amount, 2), round(rate_used, 6), timestamp)
+        return (converted_amount, rate_used, timestamp)
+    
+    @staticmethod
+    def convert_amounts_bulk(amounts, from_currency, to_currency):
+        """
+        Convert many amounts between the same pair of currencies.
+        Looks the rates up once instead of once per amount (e.g. for reports).
+        
+        Args:
+            amounts: Iterable of amounts
+            from_currency: Source currency code
+            to_currency: Target currency code
+            
+        Returns:
+            tuple: (list of converted Decimal amounts, rate_used, timestamp)
+        """
+        amounts = [CurrencyService._to_decimal(amount) for amount in amounts]
+        
+        if from_currency == to_currency:
+            return (amounts, Decimal('1'), datetime.utcnow())
+        
+        from_rate = CurrencyService.get_latest_rate(from_currency)
+        to_rate = CurrencyService.get_latest_rate(to_currency)
+        
+        if not from_rate or not to_rate:
+            raise ValueError(f"Exchange rate not found for {from_currency} or {to_currency}")
+        
+        converted = [CurrencyService._convert_with_rates(amount, from_rate, to_rate)[0] for amount in amounts]
+        rate_used = CurrencyService._convert_with_rates(Decimal('1'), from_rate, to_rate)[1]
+        timestamp = min(from_rate.timestamp, to_rate.timestamp)
+        
+        return (converted, rate_used, timestamp)
+    
+    @staticmethod
+    def _to_decimal(amount):
+        """Pass Decimals through; convert floats via their shortest repr, ints/strings directly."""
+        if isinstance(amount, Decimal):
+            return amount
+        if isinstance(amount, float):
+            return Decimal(str(amount))
+        return Decimal(amount)
+    
+    @staticmethod
+    def _convert_with_rates(amount, from_rate, to_rate):
+        """Convert a Decimal amount with two ExchangeRate rows (Numeric columns, no float round-trip)."""
+        rate_to_usd = Decimal(from_rate.rate_to_usd)
+        rate_from_usd = Decimal(to_rate.rate_from_usd)
+        
+        # Convert to USD first, then to target currency
+        converted_amount = (amount * rate_to_usd * rate_from_usd).quantize(CENT, rounding=ROUND_HALF_EVEN)
+        
+        # Calculate the effective rate
+        rate_used = (rate_from_usd / rate_to_usd).quantize(RATE_PLACES, rounding=ROUND_HALF_EVEN) if rate_to_usd != 0 else Decimal('0')
+        
+        return converted_amount, rate_used
     
     @staticmethod
-    def should_update_rates():
+    def should_update_rates(max_age_hours=12):
         """
         Check if exchange rates need to be updated.
-        Returns True if the most recent rate is older than 12 hours.
+        Returns True if the most recent rate is older than max_age_hours.
         """
         latest_rate = ExchangeRate.query.order_by(desc(ExchangeRate.timestamp)).first()
         
@@ -240,4 +339,4 @@ class CurrencyService:
             return True
         
         time_since_update = datetime.utcnow() - latest_rate.timestamp
-        return time_since_update > timedelta(hours=12)
+        return time_since_update > timedelta(hours=max_age_hours)
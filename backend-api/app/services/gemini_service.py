@@ -1,17 +1,41 @@
 # app/services/gemini_service.py
 
-import os
 import json
+import hashlib
+import mimetypes
+import threading
+import multiprocessing
+import queue
+import time
+from datetime import datetime
+from io import BytesIO
+import logging
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlparse
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+from cachetools import TTLCache
+import pymongo
+from PIL import Image, ImageOps
 from config import Config
+from app.http_session import create_session
+from app.mongo_connector import MongoDBConnector
+
+logger = logging.getLogger(__name__)
 
 # Gemini API will be configured when first used (lazy initialization)
 _gemini_configured = False
+_config_lock = threading.Lock()
 
 def _ensure_gemini_configured():
-    """Configure Gemini API if not already configured"""
+    """Configure Gemini API if not already configured (once, even across threads)"""
     global _gemini_configured
-    if not _gemini_configured:
+    if _gemini_configured:
+        return
+    with _config_lock:
+        if _gemini_configured:
+            return
         api_key = Config.GEMINI_API_KEY
         if not api_key:
             raise ValueError("GEMINI_API_KEY is not set in environment variables")
@@ -24,103 +48,692 @@ EXTRACTION_SCHEMA = {
     "type": "object",
     "properties": {
         "vendor_name": {"type": "string", "description": "The name of the store or vendor."},
-        "receipt_number": {"type": "string", "description": "The unique transaction number, often labeled INV or TNX."},
+        "receipt_number": {"type": "string", "nullable": True, "description": "The unique transaction number, often labeled INV or TNX."},
         "total_amount": {"type": "number", "description": "The final total amount paid."},
-        "currency": {"type": "string", "description": "The currency of the transaction (e.g., USD, EUR)."},
+        "currency": {"type": "string", "nullable": True, "description": "The currency of the transaction (e.g., USD, EUR)."},
         "transaction_date": {"type": "string", "description": "The date of the transaction in YYYY-MM-DD format."},
-        "payer_name": {"type": "string", "description": "The name of the person who paid, if visible on the receipt (e.g., cardholder name, customer name)."},
+        "payer_name": {"type": "string", "nullable": True, "description": "The name of the person who paid, if visible on the receipt (e.g., cardholder name, customer name)."},
     },
     "required": ["vendor_name", "total_amount", "transaction_date"],
 }
 
-def extract_receipt_data(image_url: str = None, image_file=None):
+# System instruction for the extraction model. Output format is enforced by
+# JSON mode + EXTRACTION_SCHEMA, so only the field semantics are described.
+EXTRACTION_PROMPT = """
+You are an expert financial data extraction system. Extract the following information from the receipt image:
+
+- vendor_name: The name of the store or vendor
+- receipt_number: The unique transaction number (often labeled as INV, TNX, or Receipt #)
+- total_amount: The final total amount paid (just the number, no currency symbol)
+- currency: The currency of the transaction (e.g., USD, EUR, GBP)
+- transaction_date: The date of the transaction in YYYY-MM-DD format
+- payer_name: The name of the person who paid (look for cardholder name, customer name, or any person's name on the receipt)
+
+Use null for optional fields that cannot be found.
+"""
+
+# Multi-receipt variant: one request carries several images, each preceded by
+# a "Receipt <key>:" marker, and the model returns one object per key.
+BATCH_EXTRACTION_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "receipt_key": {"type": "string", "description": "The key from the 'Receipt <key>:' marker preceding the image."},
+            **EXTRACTION_SCHEMA["properties"],
+        },
+        "required": ["receipt_key", *EXTRACTION_SCHEMA["required"]],
+    },
+}
+
+BATCH_EXTRACTION_PROMPT = EXTRACTION_PROMPT + """
+The request contains several receipt images. Each image is preceded by a line "Receipt <key>:".
+Return a JSON array with one object per image, setting receipt_key to that image's key.
+"""
+
+_models = {}
+_model_lock = threading.Lock()
+
+def _get_model(batch=False):
+    """
+    Return the shared GenerativeModel, creating it on first use.
+    
+    The model is built once per process with the prompt as its system
+    instruction and JSON mode constrained to EXTRACTION_SCHEMA (or
+    BATCH_EXTRACTION_SCHEMA for multi-receipt requests).
+    """
+    model = _models.get(batch)
+    if model is None:
+        with _model_lock:
+            model = _models.get(batch)
+            if model is None:
+                # Ensure Gemini is configured before using
+                _ensure_gemini_configured()
+                model = genai.GenerativeModel(
+                    model_name='gemini-2.5-flash',
+                    generation_config={
+                        "temperature": 0.1,  # Lower temperature for more consistent extraction
+                        "response_mime_type": "application/json",
+                        "response_schema": BATCH_EXTRACTION_SCHEMA if batch else EXTRACTION_SCHEMA,
+                    },
+                    system_instruction=BATCH_EXTRACTION_PROMPT if batch else EXTRACTION_PROMPT
+                )
+                _models[batch] = model
+    return model
+
+# Build the models at import when the key is available so the first request
+# doesn't pay for configuration and model setup (both are local, no network)
+if Config.GEMINI_API_KEY:
+    _get_model()
+    _get_model(batch=True)
+
+# Transient Gemini errors worth retrying (rate limit, overload, timeouts)
+_RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+_exponential_wait = wait_exponential(multiplier=1, max=30)
+
+def _retry_wait(retry_state):
+    """Wait for the server's Retry-After / retry_delay hint if given, else back off exponentially."""
+    error = retry_state.outcome.exception()
+    
+    retry_after = getattr(getattr(error, 'response', None), 'headers', {}).get('Retry-After')
+    if retry_after and retry_after.isdigit():
+        return min(int(retry_after), 60)
+    
+    for detail in getattr(error, 'details', None) or []:
+        retry_delay = getattr(detail, 'retry_delay', None)
+        if retry_delay is not None:
+            return min(retry_delay.total_seconds(), 60)
+    
+    return _exponential_wait(retry_state)
+
+@retry(
+    retry=retry_if_exception_type(_RETRYABLE_ERRORS),
+    wait=_retry_wait,
+    stop=stop_after_attempt(5),
+    reraise=True
+)
+def _generate_content(model, contents):
+    """Call model.generate_content, retrying rate-limit and transient server errors."""
+    return model.generate_content(contents)
+
+# Magic numbers for the image formats accepted by the upload endpoint
+_IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+
+def _detect_mime_type(data, name=None, declared=None):
+    """Pick the image MIME type from the declared type, the file name, or the bytes."""
+    if declared and declared.startswith('image/'):
+        return declared
+    if name:
+        guessed = mimetypes.guess_type(urlparse(name).path)[0]
+        if guessed and guessed.startswith('image/'):
+            return guessed
+    for signature, mime_type in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'
+
+def _image_part_from_file(image_file):
+    """Build an inline image part from an uploaded file object or raw bytes."""
+    if hasattr(image_file, 'read'):
+        data = image_file.read()
+        return {
+            'mime_type': _detect_mime_type(data, getattr(image_file, 'filename', None), getattr(image_file, 'mimetype', None)),
+            'data': data
+        }
+    return {'mime_type': _detect_mime_type(image_file), 'data': image_file}
+
+# Session for receipt image downloads, sized for GEMINI_MAX_WORKERS parallel
+# fetches. Some image hosts reject non-browser clients, hence the User-Agent.
+_image_session = create_session(
+    pool_connections=16,
+    pool_maxsize=32,
+    headers={
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    }
+)
+
+def _image_part_from_url(image_url):
+    """Download an image (pooled session, size-capped) and build an inline image part."""
+    max_bytes = Config.MAX_CONTENT_LENGTH
+    
+    with _image_session.get(image_url, timeout=30, stream=True) as response:
+        response.raise_for_status()
+        
+        # Reject oversized images before reading the body (same limit as uploads)
+        content_length = int(response.headers.get('Content-Length') or 0)
+        if content_length > max_bytes:
+            return {'error': f'Image too large ({content_length} bytes). Maximum is {max_bytes} bytes.'}
+        
+        data = response.raw.read(max_bytes + 1, decode_content=True)
+        content_type = (response.headers.get('Content-Type') or '').split(';')[0].strip()
+    
+    if len(data) > max_bytes:
+        return {'error': f'Image too large. Maximum is {max_bytes} bytes.'}
+    
+    return {'mime_type': _detect_mime_type(data, image_url, content_type), 'data': data}
+
+# Extraction results keyed by sha256 of the image bytes. Hot entries are kept
+# in process; every result is also stored in the MongoDB ai_extractions
+# collection (expired by a TTL index, see AI_EXTRACTIONS_TTL) so resubmitted
+# images skip the model across restarts/workers.
+_extraction_cache = TTLCache(maxsize=1024, ttl=24 * 3600)
+_extraction_cache_lock = threading.Lock()
+
+# The MongoDB tier is an optimisation, so it must never stall an upload: each
+# call is capped at MONGO_CACHE_TIMEOUT (including server selection), and after
+# a failure the tier is skipped for MONGO_CACHE_BACKOFF seconds
+MONGO_CACHE_TIMEOUT = 0.3  # seconds
+MONGO_CACHE_BACKOFF = 30  # seconds
+_mongo_cache_retry_at = 0.0
+
+def _mongo_cache_available():
+    """False while the MongoDB extraction cache is backing off after a failure."""
+    return time.monotonic() >= _mongo_cache_retry_at
+
+def _mongo_cache_failed(operation, error):
+    """Open the circuit: skip the MongoDB extraction cache for MONGO_CACHE_BACKOFF."""
+    global _mongo_cache_retry_at
+    _mongo_cache_retry_at = time.monotonic() + MONGO_CACHE_BACKOFF
+    logger.warning(f"Extraction cache {operation} failed, skipping MongoDB for {MONGO_CACHE_BACKOFF}s: {error}")
+
+def _image_hash(image_part):
+    """Content hash identifying an image for the extraction cache."""
+    return hashlib.sha256(image_part['data']).hexdigest()
+
+def _get_cached_extraction(image_hash):
+    """Look up a previous extraction for the image, or None."""
+    with _extraction_cache_lock:
+        cached = _extraction_cache.get(image_hash)
+    
+    if cached is None:
+        if not _mongo_cache_available():
+            return None
+        try:
+            with pymongo.timeout(MONGO_CACHE_TIMEOUT):
+                document = MongoDBConnector.get_collection('ai_extractions').find_one(
+                    {'image_hash': image_hash}, {'_id': 0, 'data': 1}
+                )
+        except Exception as e:
+            _mongo_cache_failed('lookup', e)
+            return None
+        
+        if document is None:
+            return None
+        
+        cached = document['data']
+        with _extraction_cache_lock:
+            _extraction_cache[image_hash] = cached
+    
+    logger.debug("Extraction cache hit for image %s", image_hash)
+    return dict(cached)
+
+def _cache_extraction(image_hash, extracted_data):
+    """Remember a successful extraction for the image."""
+    with _extraction_cache_lock:
+        _extraction_cache[image_hash] = dict(extracted_data)
+    
+    if not _mongo_cache_available():
+        return
+    try:
+        with pymongo.timeout(MONGO_CACHE_TIMEOUT):
+            MongoDBConnector.get_collection('ai_extractions').update_one(
+                {'image_hash': image_hash},
+                {'$set': {'data': extracted_data, 'created_at': datetime.utcnow()}},
+                upsert=True
+            )
+    except Exception as e:
+        _mongo_cache_failed('store', e)
+
+def _decode_resize(data, max_edge, quality):
+    """
+    Decode, shrink and re-encode an image as JPEG. Top-level so it can run in
+    the image process pool.
+    
+    Returns:
+        bytes: The re-encoded image
+    """
+    with Image.open(BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        
+        buffer = BytesIO()
+        img.save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True)
+        return buffer.getvalue()
+
+_image_pool = None
+_image_pool_lock = threading.Lock()
+
+def _get_image_pool():
+    """Return the process pool for image resizing, or None to resize in-thread."""
+    global _image_pool
+    if not Config.IMAGE_PROCESS_WORKERS:
+        return None
+    if _image_pool is None:
+        with _image_pool_lock:
+            if _image_pool is None:
+                # spawn: forking a process that already runs threads is unsafe
+                _image_pool = ProcessPoolExecutor(
+                    max_workers=Config.IMAGE_PROCESS_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _image_pool
+
+def _downscale_image_part(image_part):
+    """
+    Shrink large images to MAX_IMAGE_EDGE pixels on the long edge and
+    re-encode them as JPEG (quality JPEG_QUALITY) before sending to Gemini.
+    Phone photos are often several MB, far beyond what the model needs to
+    read a receipt. Images already small enough, or that Pillow cannot
+    open, are sent unchanged.
+    """
+    max_edge = Config.MAX_IMAGE_EDGE
+    if not max_edge:
+        return image_part
+    
+    try:
+        # Image.open only reads the header, so small images are not decoded
+        # (and never pay the round-trip to the process pool)
+        with Image.open(BytesIO(image_part['data'])) as img:
+            if max(img.size) <= max_edge:
+                return image_part
+        
+        pool = _get_image_pool()
+        if pool:
+            data = pool.submit(_decode_resize, image_part['data'], max_edge, Config.JPEG_QUALITY).result()
+        else:
+            data = _decode_resize(image_part['data'], max_edge, Config.JPEG_QUALITY)
+    except Exception as e:
+        logger.debug("Sending image unchanged, could not downscale: %s", e)
+        return image_part
+    
+    if len(data) >= len(image_part['data']):
+        return image_part
+    
+    logger.debug("Downscaled image from %d to %d bytes", len(image_part['data']), len(data))
+    return {'mime_type': 'image/jpeg', 'data': data}
+
+# Gemini Files API handles keyed by image hash. Uploaded files live for 48
+# hours; entries expire a little earlier so a handle is never reused at the edge.
+_file_handles = TTLCache(maxsize=1024, ttl=47 * 3600)
+_file_handles_lock = threading.Lock()
+
+def _image_content(image_part, image_hash, refresh=False):
+    """
+    The content part sent to the model for an image: the downscaled bytes
+    inline, or with GEMINI_USE_FILES_API a Files API handle uploaded once per
+    image and reused by later requests (retries, reprocessing).
+    """
+    if not Config.GEMINI_USE_FILES_API:
+        return _downscale_image_part(image_part)
+    
+    with _file_handles_lock:
+        handle = None if refresh else _file_handles.get(image_hash)
+    
+    if handle is None:
+        image_part = _downscale_image_part(image_part)
+        handle = genai.upload_file(
+            BytesIO(image_part['data']),
+            mime_type=image_part['mime_type'],
+            display_name=image_hash
+        )
+        with _file_handles_lock:
+            _file_handles[image_hash] = handle
+    
+    return handle
+
+def _generate_for_images(model, images):
+    """
+    Generate content for a list of (label, image part, image hash) entries.
+    A label, if given, is sent as a text part before its image. When a cached
+    Files API handle has expired, the images are re-uploaded and the request
+    is retried once.
+    """
+    def build_contents(refresh):
+        contents = []
+        for label, image_part, image_hash in images:
+            if label:
+                contents.append(label)
+            contents.append(_image_content(image_part, image_hash, refresh))
+        return contents
+    
+    try:
+        return _generate_content(model, build_contents(refresh=False))
+    except (google_exceptions.NotFound, google_exceptions.PermissionDenied):
+        if not Config.GEMINI_USE_FILES_API:
+            raise
+        logger.info("Gemini file handle expired, re-uploading images")
+        return _generate_content(model, build_contents(refresh=True))
+
+def _image_part(source):
+    """Build an inline image part from a URL, an uploaded file object or raw bytes."""
+    if isinstance(source, str):
+        return _image_part_from_url(source)
+    return _image_part_from_file(source)
+
+def extract_receipt_data(image_url: str = None, image_file=None, force_refresh=False):
     """
     Uses the Gemini API to extract structured data from a receipt image.
+    Images that were extracted before (same bytes) are served from the
+    extraction cache without calling the model.
     
     Args:
         image_url: The public URL of the receipt image (optional if image_file provided).
         image_file: A file object or bytes from an uploaded image (optional if image_url provided).
+        force_refresh: Ignore the extraction cache and call the model again.
         
     Returns:
         A dictionary of structured data or None if extraction fails.
     """
     try:
-        # Ensure Gemini is configured before using
-        _ensure_gemini_configured()
-        # Initialize the model with JSON mode for structured output
-        model = genai.GenerativeModel(
-            model_name='gemini-2.5-flash',
-            generation_config={
-                "temperature": 0.1,  # Lower temperature for more consistent extraction
-            }
-        )
-
-        # Define the prompt with clear instructions
-        prompt = """
-        You are an expert financial data extraction system. Extract the following information from the receipt image:
-        
-        - vendor_name: The name of the store or vendor
-        - receipt_number: The unique transaction number (often labeled as INV, TNX, or Receipt #)
-        - total_amount: The final total amount paid (just the number, no currency symbol)
-        - currency: The currency of the transaction (e.g., USD, EUR, GBP)
-        - transaction_date: The date of the transaction in YYYY-MM-DD format
-        - payer_name: The name of the person who paid (look for cardholder name, customer name, or any person's name on the receipt)
-        
-        Return ONLY a valid JSON object with these fields. No additional text, no markdown formatting, just the raw JSON.
-        If a field cannot be found, use null for optional fields.
-        Ensure vendor_name, total_amount, and transaction_date are always present.
-        
-        Example format:
-        {"vendor_name": "Example Store", "receipt_number": "INV-12345", "total_amount": 45.99, "currency": "USD", "transaction_date": "2024-01-15", "payer_name": "John Doe"}
-        """
-
-        from io import BytesIO
-        from PIL import Image
-        
         # Handle both URL and file upload cases
         if image_file:
             # Image file was uploaded directly
-            print("Processing uploaded image file...")
-            if hasattr(image_file, 'read'):
-                # It's a file-like object
-                img = Image.open(image_file)
-            else:
-                # It's bytes
-                img = Image.open(BytesIO(image_file))
+            logger.debug("Processing uploaded image file...")
+            image_part = _image_part_from_file(image_file)
         elif image_url:
-            # Download the image from URL
-            import requests
-            print(f"Downloading image from: {image_url}")
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(image_url, headers=headers, timeout=30)
-            response.raise_for_status()
-            img = Image.open(BytesIO(response.content))
+            logger.debug("Downloading image from: %s", image_url)
+            image_part = _image_part_from_url(image_url)
         else:
             return {'error': 'No image source provided. Please provide either image_url or image_file.'}
         
-        # Generate content with the image
-        print("Sending image to Gemini for analysis...")
-        response = model.generate_content([prompt, img])
+        if 'error' in image_part:
+            return image_part
+        
+        image_hash = _image_hash(image_part)
+        if not force_refresh:
+            cached = _get_cached_extraction(image_hash)
+            if cached is not None:
+                return cached
         
-        # Extract the text response
-        response_text = response.text.strip()
-        print(f"Raw response from Gemini: {response_text}")
+        # Generate content with the image
+        logger.debug("Sending image to Gemini for analysis...")
+        response = _generate_for_images(_get_model(), [(None, image_part, image_hash)])
         
-        # Clean up the response if it contains markdown code blocks
-        if response_text.startswith("```"):
-            # Remove markdown code blocks
-            response_text = response_text.replace("```json", "").replace("```", "").strip()
+        # JSON mode returns the raw object, no markdown fences to strip
+        response_text = response.text
+        logger.debug("Raw response from Gemini: %s", response_text)
         
         # Parse the JSON string result
         extracted_data = json.loads(response_text)
-        print(f"Successfully extracted data: {extracted_data}")
+        logger.debug("Successfully extracted data: %s", extracted_data)
+        _cache_extraction(image_hash, extracted_data)
         return extracted_data
 
     except Exception as e:
         error_type = type(e).__name__
-        print(f"{error_type}: {e}")
-        import traceback
-        traceback.print_exc()
-        return {'error': f'{error_type}: {str(e)}'}
\ No newline at end of file
+        logger.exception(f"Receipt extraction failed with {error_type}: {e}")
+        return {'error': f'{error_type}: {str(e)}'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    """Return the shared thread pool bounding concurrent Gemini calls for this process."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=Config.GEMINI_MAX_WORKERS,
+                    thread_name_prefix='gemini'
+                )
+    return _executor
+
+def extract_receipts_concurrent(images, force_refresh=False):
+    """
+    Extract several receipts in parallel, one Gemini request per image.
+    
+    Requests run on a shared pool of GEMINI_MAX_WORKERS threads, and each
+    one retries rate-limit and transient errors with exponential backoff.
+    A failing receipt does not affect the others.
+    
+    Args:
+        images: Iterable of (key, source) pairs, where source is an image URL,
+            an uploaded file object or raw image bytes.
+        force_refresh: Ignore the extraction cache and call the model again.
+    
+    Returns:
+        dict: key -> extracted data dictionary, or {'error': ...} for failures
+    """
+    executor = _get_executor()
+    futures = {}
+    for key, source in images:
+        if isinstance(source, str):
+            futures[key] = executor.submit(extract_receipt_data, image_url=source, force_refresh=force_refresh)
+        else:
+            futures[key] = executor.submit(extract_receipt_data, image_file=source, force_refresh=force_refresh)
+    
+    return {key: future.result() for key, future in futures.items()}
+
+def warm_up():
+    """
+    Open the Gemini API connection ahead of the first extraction.
+    
+    A count_tokens call (free, same service client as generate_content)
+    resolves DNS, completes the TLS handshake and sets up the client's
+    channel, so the first receipt upload doesn't pay for them. Does nothing
+    if no API key is configured.
+    """
+    if not Config.GEMINI_API_KEY:
+        return
+    
+    try:
+        _get_model().count_tokens("ping")
+        logger.info("Gemini API connection warmed up")
+    except Exception as e:
+        logger.warning(f"Gemini warm-up failed: {e}")
+
+def _safe_image_part(source):
+    """_image_part() that reports failures as an error part instead of raising."""
+    try:
+        return _image_part(source)
+    except Exception as e:
+        return {'error': f'{type(e).__name__}: {str(e)}'}
+
+def _fetch_image_parts(images):
+    """
+    Build image parts for (key, source) pairs, downloading all URL sources
+    concurrently on the shared pool (the pooled image session keeps the
+    connections alive) instead of one after another.
+    
+    Returns:
+        list: (key, image part) pairs in input order
+    """
+    executor = _get_executor()
+    parts = []
+    for key, source in images:
+        if isinstance(source, str):
+            parts.append((key, executor.submit(_safe_image_part, source)))
+        else:
+            parts.append((key, _safe_image_part(source)))
+    
+    return [
+        (key, part.result() if isinstance(part, Future) else part)
+        for key, part in parts
+    ]
+
+def extract_receipt_data_batch(images, batch_size=None, force_refresh=False):
+    """
+    Extract structured data from several receipt images using one Gemini
+    request per batch_size images instead of one request per image.
+    
+    Meant for bulk ingest and background reprocessing where per-receipt
+    latency is not critical.
+    
+    Args:
+        images: Iterable of (key, source) pairs. The key identifies the receipt
+            in the result (e.g. its receipt_id); source is an image URL, an
+            uploaded file object or raw image bytes.
+        batch_size: Maximum images per request (defaults to GEMINI_BATCH_SIZE)
+        force_refresh: Ignore the extraction cache and call the model again.
+        
+    Returns:
+        dict: key -> extracted data dictionary, or {'error': ...} for receipts
+        that could not be downloaded or extracted.
+    """
+    batch_size = batch_size or Config.GEMINI_BATCH_SIZE
+    results = {}
+    pending = []
+    
+    for key, image_part in _fetch_image_parts(images):
+        if 'error' in image_part:
+            results[key] = image_part
+            continue
+        
+        image_hash = _image_hash(image_part)
+        cached = None if force_refresh else _get_cached_extraction(image_hash)
+        if cached is not None:
+            results[key] = cached
+        else:
+            pending.append((key, image_part, image_hash))
+    
+    for start in range(0, len(pending), batch_size):
+        results.update(_extract_batch(pending[start:start + batch_size]))
+    
+    return results
+
+def _extract_batch(batch):
+    """Run one multi-image Gemini request and map the results back to their keys."""
+    images = [(f"Receipt {key}:", image_part, image_hash) for key, image_part, image_hash in batch]
+    
+    try:
+        logger.debug("Sending %d images to Gemini for analysis...", len(batch))
+        response = _generate_for_images(_get_model(batch=True), images)
+        logger.debug("Raw batch response from Gemini: %s", response.text)
+        
+        extracted = {}
+        for item in json.loads(response.text):
+            extracted[str(item.pop('receipt_key', ''))] = item
+    except Exception as e:
+        error_type = type(e).__name__
+        logger.exception(f"Batch receipt extraction failed with {error_type}: {e}")
+        return {key: {'error': f'{error_type}: {str(e)}'} for key, _, _ in batch}
+    
+    results = {}
+    for key, _, image_hash in batch:
+        extracted_data = extracted.get(str(key))
+        if extracted_data is None:
+            results[key] = {'error': 'No extraction returned for this receipt'}
+        else:
+            _cache_extraction(image_hash, extracted_data)
+            results[key] = extracted_data
+    
+    return results
+
+
+class ExtractionBatcher:
+    """
+    Coalesces concurrent single-receipt extractions into multi-image requests.
+    
+    Callers put their image on an in-process queue and block on a Future; a
+    daemon thread collects up to GEMINI_BATCH_SIZE images, waiting at most
+    MAX_WAIT after the first, and hands each batch to a pool of
+    GEMINI_MAX_WORKERS threads that sends it through extract_receipt_data_batch,
+    so batches overlap instead of queuing behind the request in flight.
+    During upload bursts this trades up to MAX_WAIT of latency for one
+    request per batch instead of one per receipt. A lone image is sent as a
+    regular single-receipt request.
+    """
+    
+    MAX_WAIT = 0.1  # seconds
+    
+    _queue = queue.Queue()
+    _thread = None
+    _lock = threading.Lock()
+    # Separate from _get_executor(): batches wait on image downloads submitted
+    # to that pool, and sharing it could leave every worker blocked on itself
+    _batch_executor = None
+    
+    @classmethod
+    def _ensure_started(cls):
+        """Start the batching thread on first use."""
+        if cls._thread is None or not cls._thread.is_alive():
+            with cls._lock:
+                if cls._thread is None or not cls._thread.is_alive():
+                    if cls._batch_executor is None:
+                        cls._batch_executor = ThreadPoolExecutor(
+                            max_workers=Config.GEMINI_MAX_WORKERS,
+                            thread_name_prefix='gemini-batch'
+                        )
+                    cls._thread = threading.Thread(target=cls._run, name='gemini-batcher', daemon=True)
+                    cls._thread.start()
+    
+    @classmethod
+    def submit(cls, source):
+        """
+        Queue an image for extraction.
+        
+        Args:
+            source: Image URL, uploaded file object or raw image bytes
+        
+        Returns:
+            Future: Resolves to the extracted data dictionary or {'error': ...}
+        """
+        cls._ensure_started()
+        future = Future()
+        cls._queue.put((future, source))
+        return future
+    
+    @classmethod
+    def extract(cls, source):
+        """Queue an image and wait for its extraction result."""
+        return cls.submit(source).result()
+    
+    @classmethod
+    def _next_batch(cls):
+        """Collect up to GEMINI_BATCH_SIZE requests, waiting at most MAX_WAIT after the first."""
+        batch = [cls._queue.get()]
+        deadline = time.monotonic() + cls.MAX_WAIT
+        
+        while len(batch) < Config.GEMINI_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(cls._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        
+        return batch
+    
+    @classmethod
+    def _run(cls):
+        """Batching thread loop: collect a batch, hand it to the pool, repeat."""
+        while True:
+            cls._batch_executor.submit(cls._process, cls._next_batch())
+    
+    @staticmethod
+    def _process(batch):
+        """Extract one batch and resolve its callers' futures."""
+        try:
+            if len(batch) == 1:
+                future, source = batch[0]
+                if isinstance(source, str):
+                    results = {0: extract_receipt_data(image_url=source)}
+                else:
+                    results = {0: extract_receipt_data(image_file=source)}
+            else:
+                results = extract_receipt_data_batch(
+                    [(index, source) for index, (_, source) in enumerate(batch)]
+                )
+        except Exception as e:
+            logger.exception(f"Batched receipt extraction failed: {e}")
+            results = {}
+        
+        for index, (future, _) in enumerate(batch):
+            future.set_result(results.get(index) or {'error': 'Receipt extraction failed'})
@@ -1,12 +1,24 @@
 # app/services/receipt_mongo_service.py
 
-from app.mongo_connector import MongoDBConnector, ReceiptDocument
+from app.mongo_connector import MongoDBConnector, ReceiptDocument, LIST_OUTPUT_STAGES
 from datetime import datetime, timedelta
 import logging
 from bson import ObjectId
+from pymongo import UpdateOne
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+import threading
 
 logger = logging.getLogger(__name__)
 
+# get_receipt_stats results keyed by uploader_id (None = all receipts). Short
+# TTL bounds staleness across processes; writes in this process clear it.
+_stats_cache = TTLCache(maxsize=1024, ttl=60)
+_stats_cache_lock = threading.Lock()
+
+# Background writers for saves the caller doesn't need to wait for
+_write_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='mongo-write')
+
 
 class ReceiptMongoService:
     """
@@ -14,6 +26,12 @@ class ReceiptMongoService:
     Handles CRUD operations and archiving logic.
     """
     
+    @staticmethod
+    def clear_stats_cache():
+        """Drop cached receipt statistics after receipts change."""
+        with _stats_cache_lock:
+            _stats_cache.clear()
+    
     @staticmethod
     def save_receipt(receipt_id, uploader_id, image_url, raw_ai_data=None, 
                      extracted_items=None, metadata=None, **kwargs):
@@ -55,6 +73,7 @@ class ReceiptMongoService:
             # Insert into MongoDB
             result = collection.insert_one(document)
             document['_id'] = result.inserted_id
+            ReceiptMongoService.clear_stats_cache()
             
             logger.info(f"Receipt {receipt_id} saved to MongoDB")
             return document
@@ -63,6 +82,20 @@ class ReceiptMongoService:
             logger.error(f"Error saving receipt to MongoDB: {e}")
             return None
     
+    @staticmethod
+    def save_receipt_async(receipt_id, uploader_id, image_url, **kwargs):
+        """
+        Save a receipt to MongoDB on a background thread so the caller can
+        respond without waiting on the write. Takes the same arguments as
+        save_receipt; errors are logged there.
+        
+        Returns:
+            Future: Resolves to the saved document or None on error
+        """
+        return _write_executor.submit(
+            ReceiptMongoService.save_receipt, receipt_id, uploader_id, image_url, **kwargs
+        )
+    
     @staticmethod
     def get_receipt(receipt_id, include_archived=False):
         """
@@ -96,23 +129,30 @@ class ReceiptMongoService:
             list: List of receipt documents
         """
         try:
-            receipts = ReceiptDocument.get_by_user(
+            # _id comes back as a string, ready for JSON serialization
+            return ReceiptDocument.get_by_user(
                 uploader_id, 
                 include_archived, 
                 limit, 
                 skip
             )
-            
-            # Convert ObjectId to string for JSON serialization
-            for receipt in receipts:
-                if '_id' in receipt:
-                    receipt['_id'] = str(receipt['_id'])
-            
-            return receipts
         except Exception as e:
             logger.error(f"Error getting user receipts from MongoDB: {e}")
             return []
     
+    @staticmethod
+    def iter_user_receipts(uploader_id, include_archived=False, limit=100, skip=0):
+        """
+        Lazily iterate a user's receipts (same arguments as get_user_receipts).
+        
+        Yields:
+            dict: Receipt documents
+        """
+        try:
+            yield from ReceiptDocument.find_by_user(uploader_id, include_archived, limit, skip)
+        except Exception as e:
+            logger.error(f"Error getting user receipts from MongoDB: {e}")
+    
     @staticmethod
     def update_receipt(receipt_id, updates):
         """
@@ -128,12 +168,43 @@ class ReceiptMongoService:
         try:
             success = ReceiptDocument.update_document(receipt_id, updates)
             if success:
+                ReceiptMongoService.clear_stats_cache()
                 logger.info(f"Receipt {receipt_id} updated in MongoDB")
             return success
         except Exception as e:
             logger.error(f"Error updating receipt in MongoDB: {e}")
             return False
     
+    @staticmethod
+    def bulk_update_receipts(updates):
+        """
+        Update several receipt documents in one bulk_write round-trip.
+        
+        Args:
+            updates: Dictionary of receipt_id -> fields to update
+        
+        Returns:
+            int: Number of documents modified
+        """
+        if not updates:
+            return 0
+        
+        try:
+            collection = MongoDBConnector.get_collection('receipts')
+            now = datetime.utcnow()
+            
+            result = collection.bulk_write([
+                UpdateOne({'receipt_id': receipt_id}, {'$set': {**fields, 'updated_at': now}})
+                for receipt_id, fields in updates.items()
+            ], ordered=False)
+            ReceiptMongoService.clear_stats_cache()
+            
+            logger.info(f"Bulk updated {result.modified_count} receipts in MongoDB")
+            return result.modified_count
+        except Exception as e:
+            logger.error(f"Error bulk updating receipts in MongoDB: {e}")
+            return 0
+    
     @staticmethod
     def archive_receipt(receipt_id, reason='user_requested'):
         """
@@ -149,6 +220,7 @@ class ReceiptMongoService:
         try:
             success = ReceiptDocument.archive_document(receipt_id, reason)
             if success:
+                ReceiptMongoService.clear_stats_cache()
                 logger.info(f"Receipt {receipt_id} archived: {reason}")
             return success
         except Exception as e:
@@ -169,6 +241,7 @@ class ReceiptMongoService:
         try:
             success = ReceiptDocument.unarchive_document(receipt_id)
             if success:
+                ReceiptMongoService.clear_stats_cache()
                 logger.info(f"Receipt {receipt_id} unarchived")
             return success
         except Exception as e:
@@ -188,18 +261,28 @@ class ReceiptMongoService:
             list: List of archived receipt documents
         """
         try:
-            receipts = ReceiptDocument.get_archived_receipts(uploader_id, days_old)
-            
-            # Convert ObjectId to string
-            for receipt in receipts:
-                if '_id' in receipt:
-                    receipt['_id'] = str(receipt['_id'])
-            
-            return receipts
+            return ReceiptDocument.get_archived_receipts(uploader_id, days_old)
         except Exception as e:
             logger.error(f"Error getting archived receipts from MongoDB: {e}")
             return []
     
+    @staticmethod
+    def iter_archived_receipts(uploader_id=None, days_old=None):
+        """
+        Lazily iterate archived receipts with optional filters.
+        
+        Args:
+            uploader_id: Filter by user (optional)
+            days_old: Get receipts archived more than X days ago (optional)
+        
+        Yields:
+            dict: Archived receipt documents
+        """
+        try:
+            yield from ReceiptDocument.find_archived(uploader_id, days_old)
+        except Exception as e:
+            logger.error(f"Error getting archived receipts from MongoDB: {e}")
+    
     @staticmethod
     def delete_receipt(receipt_id, permanent=False):
         """
@@ -215,6 +298,7 @@ class ReceiptMongoService:
         try:
             success = ReceiptDocument.delete_document(receipt_id, permanent)
             if success:
+                ReceiptMongoService.clear_stats_cache()
                 action = "permanently deleted" if permanent else "archived"
                 logger.info(f"Receipt {receipt_id} {action}")
             return success
@@ -258,6 +342,9 @@ class ReceiptMongoService:
                 }
             )
             
+            if result.modified_count:
+                ReceiptMongoService.clear_stats_cache()
+            
             logger.info(f"Bulk archived {result.modified_count} receipts")
             return result.modified_count
             
@@ -269,13 +356,21 @@ class ReceiptMongoService:
     def get_receipt_stats(uploader_id=None):
         """
         Get statistics about receipts.
+        All metrics are computed in a single $facet aggregation (one round-trip),
+        and results are cached for up to a minute per uploader.
         
         Args:
             uploader_id: Optional user filter
         
         Returns:
-            dict: Statistics including total, archived, pending, etc.
+            dict: Statistics including total, archived, pending, status breakdown,
+                  amount totals and monthly counts
         """
+        with _stats_cache_lock:
+            cached = _stats_cache.get(uploader_id)
+        if cached is not None:
+            return cached
+        
         try:
             collection = MongoDBConnector.get_collection('receipts')
             
@@ -286,42 +381,71 @@ class ReceiptMongoService:
             pipeline = [
                 {'$match': query},
                 {
-                    '$group': {
-                        '_id': None,
-                        'total': {'$sum': 1},
-                        'archived': {
-                            '$sum': {'$cond': [{'$eq': ['$archived', True]}, 1, 0]}
-                        },
-                        'active': {
-                            '$sum': {'$cond': [{'$eq': ['$archived', False]}, 1, 0]}
-                        },
-                        'pending': {
-                            '$sum': {'$cond': [{'$eq': ['$status', 'PENDING']}, 1, 0]}
-                        },
-                        'confirmed': {
-                            '$sum': {'$cond': [{'$eq': ['$status', 'CONFIRMED']}, 1, 0]}
-                        },
-                        'total_size': {'$sum': '$file_size'}
+                    '$facet': {
+                        'status': [
+                            {'$group': {'_id': '$status', 'count': {'$sum': 1}}}
+                        ],
+                        'totals': [
+                            {
+                                '$group': {
+                                    '_id': None,
+                                    'total': {'$sum': 1},
+                                    'archived': {
+                                        '$sum': {'$cond': [{'$eq': ['$archived', True]}, 1, 0]}
+                                    },
+                                    'active': {
+                                        '$sum': {'$cond': [{'$eq': ['$archived', False]}, 1, 0]}
+                                    },
+                                    'total_size': {'$sum': '$file_size'},
+                                    'total_amount': {'$sum': '$metadata.total_amount'},
+                                    'average_amount': {'$avg': '$metadata.total_amount'}
+                                }
+                            }
+                        ],
+                        'by_month': [
+                            {'$match': {'metadata.transaction_date': {'$type': 'string'}}},
+                            {
+                                '$group': {
+                                    '_id': {'$substrBytes': ['$metadata.transaction_date', 0, 7]},
+                                    'count': {'$sum': 1},
+                                    'total_amount': {'$sum': '$metadata.total_amount'}
+                                }
+                            },
+                            {'$sort': {'_id': 1}}
+                        ]
                     }
                 }
             ]
             
-            result = list(collection.aggregate(pipeline))
+            result = next(collection.aggregate(pipeline), {})
+            
+            totals = result.get('totals') or [{}]
+            stats = totals[0]
+            stats.pop('_id', None)
             
-            if result:
-                stats = result[0]
-                stats.pop('_id', None)
-                return stats
+            by_status = {row['_id']: row['count'] for row in result.get('status', [])}
             
-            return {
-                'total': 0,
-                'archived': 0,
-                'active': 0,
-                'pending': 0,
-                'confirmed': 0,
-                'total_size': 0
+            stats = {
+                'total': stats.get('total', 0),
+                'archived': stats.get('archived', 0),
+                'active': stats.get('active', 0),
+                'pending': by_status.get('PENDING', 0),
+                'confirmed': by_status.get('CONFIRMED', 0),
+                'total_size': stats.get('total_size', 0),
+                'total_amount': stats.get('total_amount', 0),
+                'average_amount': stats.get('average_amount'),
+                'by_status': by_status,
+                'by_month': [
+                    {'month': row['_id'], 'count': row['count'], 'total_amount': row['total_amount']}
+                    for row in result.get('by_month', [])
+                ]
             }
             
+            with _stats_cache_lock:
+                _stats_cache[uploader_id] = stats
+            
+            return stats
+            
         except Exception as e:
             logger.error(f"Error getting receipt stats: {e}")
             return {}
@@ -329,7 +453,9 @@ class ReceiptMongoService:
     @staticmethod
     def search_receipts(query_text, uploader_id=None, include_archived=False):
         """
-        Search receipts by text (vendor name, receipt number, etc.).
+        Search receipts by text (vendor name, receipt number, tags).
+        Uses the receipt_text_search text index, so matching is by word
+        (case-insensitive, stemmed) and results are ranked by relevance.
         
         Args:
             query_text: Text to search for
@@ -342,14 +468,8 @@ class ReceiptMongoService:
         try:
             collection = MongoDBConnector.get_collection('receipts')
             
-            # Build search query
-            search_conditions = {
-                '$or': [
-                    {'metadata.vendor_name': {'$regex': query_text, '$options': 'i'}},
-                    {'metadata.receipt_number': {'$regex': query_text, '$options': 'i'}},
-                    {'tags': {'$regex': query_text, '$options': 'i'}}
-                ]
-            }
+            # Build search query (an unanchored $regex could not use any index)
+            search_conditions = {'$text': {'$search': query_text}}
             
             if uploader_id:
                 search_conditions['uploader_id'] = uploader_id
@@ -357,14 +477,12 @@ class ReceiptMongoService:
             if not include_archived:
                 search_conditions['archived'] = False
             
-            receipts = list(collection.find(search_conditions).sort('created_at', -1))
-            
-            # Convert ObjectId to string
-            for receipt in receipts:
-                if '_id' in receipt:
-                    receipt['_id'] = str(receipt['_id'])
-            
-            return receipts
+            return list(collection.aggregate([
+                {'$match': search_conditions},
+                {'$addFields': {'score': {'$meta': 'textScore'}}},
+                {'$sort': {'score': -1, 'created_at': -1}},
+                *LIST_OUTPUT_STAGES
+            ]))
             
         except Exception as e:
             logger.error(f"Error searching receipts: {e}")
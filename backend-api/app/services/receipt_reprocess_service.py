@@ -0,0 +1,116 @@
+# app/services/receipt_reprocess_service.py
+
+from app import db
+from app.models import Receipt
+from app.schemas import ReceiptExtraction
+from app.services.gemini_service import extract_receipt_data_batch
+from app.services.receipt_mongo_service import ReceiptMongoService
+from pydantic import ValidationError
+from datetime import datetime, timedelta
+from config import Config
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+UPLOADED_PREFIX = 'uploaded://'
+
+
+class ReceiptReprocessService:
+    """
+    Service for re-running AI extraction on receipts whose upload-time
+    extraction failed. Receipts are sent to Gemini in multi-image batches,
+    since nobody is waiting on the result.
+    """
+    
+    @staticmethod
+    def _image_source(image_url):
+        """Resolve a stored image_url to something extract_receipt_data_batch accepts."""
+        if image_url.startswith(UPLOADED_PREFIX):
+            path = os.path.join(Config.UPLOAD_FOLDER, image_url[len(UPLOADED_PREFIX):])
+            with open(path, 'rb') as f:
+                return f.read()
+        return image_url
+    
+    @staticmethod
+    def reprocess_failed_receipts(limit=32, max_age_hours=24, max_attempts=None):
+        """
+        Re-extract recent receipts in ERROR status and move the successful
+        ones back to PENDING_CONFIRMATION for the user to review.
+        
+        Each attempt is counted on the receipt, and receipts that reached
+        max_attempts are left alone, so an image that always fails does not
+        spend API quota on every run.
+        
+        Args:
+            limit (int): Maximum receipts to process per run
+            max_age_hours (int): Only retry receipts uploaded within this window
+            max_attempts (int): Attempts per receipt (defaults to RECEIPT_REPROCESS_MAX_ATTEMPTS)
+        
+        Returns:
+            dict: Number of receipts processed and recovered
+        """
+        max_attempts = max_attempts or Config.RECEIPT_REPROCESS_MAX_ATTEMPTS
+        now = datetime.utcnow()
+        cutoff = now - timedelta(hours=max_age_hours)
+        receipts = Receipt.query.filter(
+            Receipt.status == 'ERROR',
+            Receipt.timestamp >= cutoff,
+            Receipt.reprocess_attempts < max_attempts
+        ).order_by(Receipt.timestamp.desc()).limit(limit).all()
+        
+        if not receipts:
+            return {'processed': 0, 'recovered': 0}
+        
+        sources = []
+        for receipt in receipts:
+            receipt.reprocess_attempts += 1
+            receipt.last_reprocess_at = now
+            try:
+                sources.append((receipt.id, ReceiptReprocessService._image_source(receipt.image_url)))
+            except OSError as e:
+                logger.warning(f"Skipping receipt {receipt.id}, image not readable: {e}")
+        
+        results = extract_receipt_data_batch(sources)
+        
+        recovered = []
+        for receipt in receipts:
+            extracted_data = results.get(receipt.id)
+            if not extracted_data or 'error' in extracted_data:
+                continue
+            
+            try:
+                extraction = ReceiptExtraction.model_validate(extracted_data)
+            except ValidationError:
+                continue
+            
+            receipt.raw_ai_data = extracted_data
+            receipt.status = 'PENDING_CONFIRMATION'
+            recovered.append((receipt.id, receipt.uploader_id, receipt.image_url, extracted_data, extraction))
+        
+        db.session.commit()
+        
+        # ERROR receipts were never stored in MongoDB at upload: create the
+        # missing documents (save_receipt leaves existing ones alone), then
+        # update the ones that did exist
+        for receipt_id, uploader_id, image_url, extracted_data, extraction in recovered:
+            ReceiptMongoService.save_receipt(
+                receipt_id=receipt_id,
+                uploader_id=uploader_id,
+                image_url=image_url,
+                raw_ai_data=extracted_data,
+                metadata=extraction.to_metadata(),
+                status='PENDING_CONFIRMATION'
+            )
+        
+        ReceiptMongoService.bulk_update_receipts({
+            receipt_id: {
+                'raw_ai_data': extracted_data,
+                'metadata': extraction.to_metadata(),
+                'status': 'PENDING_CONFIRMATION'
+            }
+            for receipt_id, _, _, extracted_data, extraction in recovered
+        })
+        
+        logger.info(f"Reprocessed {len(receipts)} failed receipts, {len(recovered)} recovered")
+        return {'processed': len(receipts), 'recovered': len(recovered)}
@@ -3,6 +3,9 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from app.services.currency_service import CurrencyService
+from app.services.audit_partition_service import AuditPartitionService
+from app.services.receipt_reprocess_service import ReceiptReprocessService
+from app.services import gemini_service
 from datetime import datetime
 import logging
 import atexit
@@ -31,16 +34,43 @@ class SchedulerService:
         # Store app context for use in scheduled jobs
         cls._app = app
         
-        # Add job to update exchange rates every 12 hours
+        # Add job to update exchange rates every 12 hours, starting now. Missed or
+        # overlapping runs (e.g. after restarts) coalesce into a single execution
         cls._scheduler.add_job(
             func=cls._update_exchange_rates_job,
             trigger=IntervalTrigger(hours=12),
             id='update_exchange_rates',
             name='Update currency exchange rates',
+            next_run_time=datetime.now(),
             replace_existing=True,
+            coalesce=True,
+            misfire_grace_time=3600,
             max_instances=1
         )
         
+        # Add job to keep audit_logs monthly partitions ahead of time (no-op if not partitioned)
+        cls._scheduler.add_job(
+            func=cls._maintain_audit_partitions_job,
+            trigger=IntervalTrigger(days=1),
+            id='maintain_audit_partitions',
+            name='Maintain audit log partitions',
+            next_run_time=datetime.now(),
+            replace_existing=True,
+            max_instances=1
+        )
+        
+        # Batch re-extraction of failed uploads (off unless an interval is configured)
+        reprocess_minutes = app.config.get('RECEIPT_REPROCESS_INTERVAL_MINUTES', 0)
+        if reprocess_minutes:
+            cls._scheduler.add_job(
+                func=cls._reprocess_failed_receipts_job,
+                trigger=IntervalTrigger(minutes=reprocess_minutes),
+                id='reprocess_failed_receipts',
+                name='Reprocess failed receipt extractions',
+                replace_existing=True,
+                max_instances=1
+            )
+        
         # Start the scheduler
         cls._scheduler.start()
         cls._initialized = True
@@ -50,20 +80,29 @@ class SchedulerService:
         # Ensure scheduler shuts down cleanly on app exit
         atexit.register(cls.shutdown)
         
-        # Run initial update on startup (in background)
+        # Warm up the Gemini connection in the background so the first upload doesn't pay for it
         cls._scheduler.add_job(
-            func=cls._update_exchange_rates_job,
+            func=gemini_service.warm_up,
             trigger='date',
             run_date=datetime.now(),
-            id='initial_exchange_rate_update',
-            name='Initial exchange rate update'
+            id='warm_up_gemini',
+            name='Warm up Gemini API connection',
+            replace_existing=True
         )
     
     @classmethod
-    def _update_exchange_rates_job(cls):
-        """Job function to update exchange rates within app context."""
+    def _update_exchange_rates_job(cls, force=False):
+        """
+        Job function to update exchange rates within app context.
+        Skips the API call if rates were fetched within the last 11 hours
+        (e.g. the startup run after a quick restart), unless force is set.
+        """
         with cls._app.app_context():
             try:
+                if not force and not CurrencyService.should_update_rates(max_age_hours=11):
+                    logger.info("Exchange rates are recent, skipping scheduled update")
+                    return
+                
                 logger.info("Starting scheduled exchange rate update")
                 success = CurrencyService.update_exchange_rates()
                 if success:
@@ -73,6 +112,26 @@ class SchedulerService:
             except Exception as e:
                 logger.error(f"Error in scheduled exchange rate update: {e}")
     
+    @classmethod
+    def _maintain_audit_partitions_job(cls):
+        """Job function to create upcoming and drop expired audit log partitions."""
+        with cls._app.app_context():
+            try:
+                AuditPartitionService.maintain_partitions(
+                    retention_months=cls._app.config.get('AUDIT_LOG_RETENTION_MONTHS', 0)
+                )
+            except Exception as e:
+                logger.error(f"Error in scheduled audit partition maintenance: {e}")
+    
+    @classmethod
+    def _reprocess_failed_receipts_job(cls):
+        """Job function to batch re-extract receipts whose extraction failed."""
+        with cls._app.app_context():
+            try:
+                ReceiptReprocessService.reprocess_failed_receipts()
+            except Exception as e:
+                logger.error(f"Error in scheduled receipt reprocessing: {e}")
+    
     @classmethod
     def shutdown(cls):
         """Shutdown the scheduler gracefully."""
@@ -97,6 +156,7 @@ class SchedulerService:
                 func=cls._update_exchange_rates_job,
                 trigger='date',
                 run_date=datetime.now(),
+                kwargs={'force': True},
                 id='manual_exchange_rate_update',
                 name='Manual exchange rate update',
                 replace_existing=True
@@ -1,10 +1,66 @@
 # app/services/user_management_service.py
 
+from flask import g, has_request_context
 from app import db
-from app.models import User, UserRole
+from app.models import User, UserRole, AuditLog
+from app.utils import invalidate_auth_cache
+from sqlalchemy import select, update, delete, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
+from dataclasses import dataclass, fields
 from datetime import datetime
 
+
+@dataclass(slots=True)
+class UserDTO:
+    """User as returned by the management API (orjson serializes it natively)."""
+    id: int
+    username: str
+    email: str
+    role: str
+    is_active: bool
+    
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.username, user.email, user.role, user.is_active)
+
+
+# Fields returned for a user by the management API
+USER_FIELDS = tuple(field.name for field in fields(UserDTO))
+
+# Role lookups, built once instead of iterating UserRole per call. Lowercase
+# names are included so the common spellings skip str.upper()
+ROLE_NAMES = ", ".join(r.name for r in UserRole)
+_ROLE_LOOKUP = {r.name: r.value for r in UserRole}
+_ROLE_LOOKUP.update({r.name.lower(): r.value for r in UserRole})
+_INVALID_ROLE_MESSAGE = f'Invalid role. Must be one of: {ROLE_NAMES}'
+
+
+def resolve_role(role):
+    """
+    Map a role name (e.g. 'BASIC_USER', case-insensitive) to its stored value.
+    
+    Returns:
+        str or None: The UserRole value, or None if the name is not a role
+    """
+    return _ROLE_LOOKUP.get(role) or _ROLE_LOOKUP.get(role.upper())
+
+
+def _load_user(user_id):
+    """
+    Load a user by primary key, reusing the request's authenticated user.
+    
+    jwt_required already loaded g.current_user (and g keeps it strongly
+    referenced), so acting on yourself costs no query; other ids go through
+    Session.get, which checks the identity map before issuing a SELECT.
+    """
+    if has_request_context():
+        current_user = g.get('current_user')
+        if current_user is not None and current_user.id == user_id:
+            return current_user
+    return db.session.get(User, user_id)
+
+
 class UserManagementService:
     """
     Service class for handling user management operations.
@@ -24,43 +80,45 @@ class UserManagementService:
             is_active (bool): Account active status
             
         Returns:
-            tuple: (success: bool, result: dict or str)
+            tuple: (success: bool, result: UserDTO or str)
         """
         try:
             # Validate role
-            role_str = role.upper()
-            try:
-                role_enum = UserRole[role_str]
-                role_value = role_enum.value
-            except KeyError:
-                return False, f'Invalid role. Must be one of: {", ".join(r.name for r in UserRole)}'
-            
-            # Check if username or email already exists
-            if User.query.filter_by(username=username).first():
-                return False, 'Username already exists'
-            
-            if User.query.filter_by(email=email).first():
-                return False, 'Email already registered'
+            role_value = resolve_role(role)
+            if role_value is None:
+                return False, _INVALID_ROLE_MESSAGE
             
-            # Create new user
-            user = User(
-                username=username,
-                email=email,
-                role=role_value,
-                is_active=is_active
-            )
+            # Single INSERT ... ON CONFLICT DO NOTHING; the unique constraints
+            # replace the username/email lookups on the happy path
+            user = User(username=username, email=email, role=role_value, is_active=is_active)
             user.set_password(password)
             
-            db.session.add(user)
+            statement = pg_insert(User)\
+                .values(
+                    username=username,
+                    email=email,
+                    password_hash=user.password_hash,
+                    role=role_value,
+                    is_active=is_active
+                )\
+                .on_conflict_do_nothing()\
+                .returning(User.id)
+            
+            user_id = db.session.execute(statement).scalar()
+            
+            if user_id is None:
+                db.session.rollback()
+                taken = db.session.execute(
+                    select(User.username).where(or_(User.username == username, User.email == email))
+                ).scalars().all()
+                if username in taken:
+                    return False, 'Username already exists'
+                return False, 'Email already registered'
+            
             db.session.commit()
             
-            return True, {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'role': user.role,
-                'is_active': user.is_active
-            }
+            user.id = user_id
+            return True, UserDTO.from_user(user)
             
         except IntegrityError as e:
             db.session.rollback()
@@ -80,7 +138,7 @@ class UserManagementService:
         Returns:
             User object or None
         """
-        return User.query.get(user_id)
+        return _load_user(user_id)
     
     @staticmethod
     def get_all_users(include_inactive=False):
@@ -91,20 +149,15 @@ class UserManagementService:
             include_inactive (bool): Include deactivated users
             
         Returns:
-            list: List of user dictionaries
+            list: List of UserDTO
         """
-        query = User.query
+        # Select just the API columns: no User objects are built or added
+        # to the identity map
+        stmt = select(*(getattr(User, field) for field in USER_FIELDS)).order_by(User.id)
         if not include_inactive:
-            query = query.filter_by(is_active=True)
+            stmt = stmt.where(User.is_active.is_(True))
         
-        users = query.all()
-        return [{
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'role': user.role,
-            'is_active': user.is_active
-        } for user in users]
+        return [UserDTO(*row) for row in db.session.execute(stmt)]
     
     @staticmethod
     def update_user_details(user_id, username=None, email=None):
@@ -117,13 +170,15 @@ class UserManagementService:
             email (str, optional): New email
             
         Returns:
-            tuple: (success: bool, result: dict or str)
+            tuple: (success: bool, result: UserDTO or str)
         """
         try:
-            user = User.query.get(user_id)
+            user = _load_user(user_id)
             if not user:
                 return False, 'User not found'
             
+            changed = False
+            
             # Update username if provided
             if username and username != user.username:
                 # Check if new username already exists
@@ -131,6 +186,7 @@ class UserManagementService:
                 if existing_user and existing_user.id != user_id:
                     return False, 'Username already taken'
                 user.username = username
+                changed = True
             
             # Update email if provided
             if email and email != user.email:
@@ -139,16 +195,13 @@ class UserManagementService:
                 if existing_user and existing_user.id != user_id:
                     return False, 'Email already registered'
                 user.email = email
+                changed = True
             
-            db.session.commit()
+            # A no-op PUT (nothing supplied or same values) stays a pure read
+            if changed:
+                db.session.commit()
             
-            return True, {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'role': user.role,
-                'is_active': user.is_active
-            }
+            return True, UserDTO.from_user(user)
             
         except IntegrityError as e:
             db.session.rollback()
@@ -171,7 +224,7 @@ class UserManagementService:
             tuple: (success: bool, message: str)
         """
         try:
-            user = User.query.get(user_id)
+            user = _load_user(user_id)
             if not user:
                 return False, 'User not found'
             
@@ -202,7 +255,7 @@ class UserManagementService:
             tuple: (success: bool, message: str)
         """
         try:
-            user = User.query.get(user_id)
+            user = _load_user(user_id)
             if not user:
                 return False, 'User not found'
             
@@ -225,31 +278,23 @@ class UserManagementService:
             new_role (str): New role (SYSTEM_ADMIN, RECEIPT_LOGGER, BASIC_USER)
             
         Returns:
-            tuple: (success: bool, result: dict or str)
+            tuple: (success: bool, result: UserDTO or str)
         """
         try:
-            user = User.query.get(user_id)
+            user = _load_user(user_id)
             if not user:
                 return False, 'User not found'
             
             # Validate new role
-            role_str = new_role.upper()
-            try:
-                role_enum = UserRole[role_str]
-                role_value = role_enum.value
-            except KeyError:
-                return False, f'Invalid role. Must be one of: {", ".join(r.name for r in UserRole)}'
-            
-            user.role = role_value
-            db.session.commit()
+            role_value = resolve_role(new_role)
+            if role_value is None:
+                return False, _INVALID_ROLE_MESSAGE
             
-            return True, {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'role': user.role,
-                'is_active': user.is_active
-            }
+            if user.role != role_value:
+                user.role = role_value
+                db.session.commit()
+            
+            return True, UserDTO.from_user(user)
             
         except Exception as e:
             db.session.rollback()
@@ -267,14 +312,17 @@ class UserManagementService:
             tuple: (success: bool, message: str)
         """
         try:
-            user = User.query.get(user_id)
-            if not user:
+            # One UPDATE ... RETURNING instead of SELECT + UPDATE
+            username = db.session.execute(
+                update(User).where(User.id == user_id).values(is_active=False).returning(User.username)
+            ).scalar()
+            if username is None:
                 return False, 'User not found'
             
-            user.is_active = False
             db.session.commit()
+            invalidate_auth_cache()
             
-            return True, f'User {user.username} deactivated successfully'
+            return True, f'User {username} deactivated successfully'
             
         except Exception as e:
             db.session.rollback()
@@ -292,14 +340,17 @@ class UserManagementService:
             tuple: (success: bool, message: str)
         """
         try:
-            user = User.query.get(user_id)
-            if not user:
+            # One UPDATE ... RETURNING instead of SELECT + UPDATE
+            username = db.session.execute(
+                update(User).where(User.id == user_id).values(is_active=True).returning(User.username)
+            ).scalar()
+            if username is None:
                 return False, 'User not found'
             
-            user.is_active = True
             db.session.commit()
+            invalidate_auth_cache()
             
-            return True, f'User {user.username} reactivated successfully'
+            return True, f'User {username} reactivated successfully'
             
         except Exception as e:
             db.session.rollback()
@@ -318,13 +369,20 @@ class UserManagementService:
             tuple: (success: bool, message: str)
         """
         try:
-            user = User.query.get(user_id)
-            if not user:
+            # Detach the user's audit history in one UPDATE (the ORM delete loaded
+            # every audit log row to null its user_id), then DELETE ... RETURNING
+            db.session.execute(
+                update(AuditLog).where(AuditLog.user_id == user_id).values(user_id=None)
+            )
+            username = db.session.execute(
+                delete(User).where(User.id == user_id).returning(User.username)
+            ).scalar()
+            if username is None:
+                db.session.rollback()
                 return False, 'User not found'
             
-            username = user.username
-            db.session.delete(user)
             db.session.commit()
+            invalidate_auth_cache()
             
             return True, f'User {username} deleted permanently'
             
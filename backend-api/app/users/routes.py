@@ -1,13 +1,39 @@
 # app/users/routes.py
 
 from flask import Blueprint, request, jsonify, g
-from app.services.user_management_service import UserManagementService
+from app.services.user_management_service import UserManagementService, UserDTO
 from app.utils import jwt_required, admin_required, audit_log
 from app.models import UserRole
 
 # Define the Blueprint for user management
 bp = Blueprint('users', __name__)
 
+
+def _json_body(*required):
+    """
+    Parse the request's JSON body once and check required fields.
+    Malformed or missing JSON is treated as an empty body.
+    
+    Returns:
+        tuple: (data, None) or (None, 400 error response) if a field is missing
+    """
+    data = request.get_json(silent=True) or {}
+    if any(not data.get(field) for field in required):
+        plural = 's' if len(required) > 1 else ''
+        return None, (jsonify({'message': f'Missing required field{plural}: {", ".join(required)}'}), 400)
+    return data, None
+
+
+def _conditional_user_response(user):
+    """
+    Serialize a user with an ETag derived from the body; a matching
+    If-None-Match gets an empty 304 instead (for polling clients).
+    """
+    response = jsonify({'user': UserDTO.from_user(user)})
+    response.add_etag()
+    return response.make_conditional(request)
+
+
 @bp.route('/users', methods=['POST'])
 @audit_log(action='CREATE_USER', resource_type='User')
 @jwt_required()
@@ -23,11 +49,10 @@ def create_user():
         - role (str, optional): User role (default: BASIC_USER)
         - is_active (bool, optional): Account status (default: true)
     """
-    data = request.get_json()
-    
     # Validate required fields
-    if not data or not data.get('username') or not data.get('email') or not data.get('password'):
-        return jsonify({'message': 'Missing required fields: username, email, password'}), 400
+    data, error = _json_body('username', 'email', 'password')
+    if error:
+        return error
     
     username = data['username']
     email = data['email']
@@ -91,15 +116,7 @@ def get_user(user_id):
     if not user:
         return jsonify({'message': 'User not found'}), 404
     
-    return jsonify({
-        'user': {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'role': user.role,
-            'is_active': user.is_active
-        }
-    }), 200
+    return _conditional_user_response(user)
 
 
 @bp.route('/users/<int:user_id>', methods=['PUT'])
@@ -117,7 +134,7 @@ def update_user(user_id):
     if g.current_user.id != user_id and g.current_user.role != UserRole.SYSTEM_ADMIN.value:
         return jsonify({'message': 'Permission denied'}), 403
     
-    data = request.get_json()
+    data, _ = _json_body()
     
     if not data:
         return jsonify({'message': 'No data provided'}), 400
@@ -155,10 +172,9 @@ def change_password(user_id):
     if g.current_user.id != user_id:
         return jsonify({'message': 'Permission denied'}), 403
     
-    data = request.get_json()
-    
-    if not data or not data.get('current_password') or not data.get('new_password'):
-        return jsonify({'message': 'Missing required fields: current_password, new_password'}), 400
+    data, error = _json_body('current_password', 'new_password')
+    if error:
+        return error
     
     current_password = data['current_password']
     new_password = data['new_password']
@@ -185,10 +201,9 @@ def admin_reset_password(user_id):
     JSON body:
         - new_password (str): New password
     """
-    data = request.get_json()
-    
-    if not data or not data.get('new_password'):
-        return jsonify({'message': 'Missing required field: new_password'}), 400
+    data, error = _json_body('new_password')
+    if error:
+        return error
     
     new_password = data['new_password']
     
@@ -213,10 +228,9 @@ def change_user_role(user_id):
     JSON body:
         - role (str): New role (SYSTEM_ADMIN, RECEIPT_LOGGER, BASIC_USER)
     """
-    data = request.get_json()
-    
-    if not data or not data.get('role'):
-        return jsonify({'message': 'Missing required field: role'}), 400
+    data, error = _json_body('role')
+    if error:
+        return error
     
     new_role = data['role']
     
@@ -295,17 +309,7 @@ def get_current_user():
     """
     Get the currently authenticated user's profile.
     """
-    user = g.current_user
-    
-    return jsonify({
-        'user': {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'role': user.role,
-            'is_active': user.is_active
-        }
-    }), 200
+    return _conditional_user_response(g.current_user)
 
 
 @bp.route('/users/roles', methods=['GET'])
@@ -1,15 +1,96 @@
 # app/utils.py
 
 from functools import wraps
-from flask import request, jsonify, g
+from flask import request, g, Response, stream_with_context
 from app.models import User # We use User.verify_auth_token here
 from app.models import UserRole # We use this for role checks
-import uuid
+from app.json_provider import dumps_bytes
+from app.services.audit_service import AuditService
+from app import db
+from cachetools import TTLCache
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+from config import Config
+import orjson
+import random
+import secrets
+import threading
+import time
+
+# Cached role value for the per-request admin check
+_ADMIN_VALUE = UserRole.SYSTEM_ADMIN.value
+
+# Fixed auth error bodies, encoded once at import. Flask responses are
+# single-use, so _error_response wraps the shared bytes in a new Response
+_TOKEN_MISSING = dumps_bytes({'message': 'Authorization token is missing.'})
+_TOKEN_MALFORMED = dumps_bytes({'message': 'Token format is invalid. Use "Bearer <token>".'})
+_TOKEN_INVALID = dumps_bytes({'message': 'Invalid or expired token.'})
+_ACCOUNT_DEACTIVATED = dumps_bytes({'message': 'Account is deactivated.'})
+_ROLE_DENIED = dumps_bytes({'message': 'Permission denied: Insufficient role access.'})
+_ADMIN_DENIED = dumps_bytes({'message': 'Admin privileges required'})
+
+
+def _error_response(body, status):
+    """Build a JSON error response from pre-encoded bytes."""
+    return Response(body, status=status, mimetype='application/json')
+
+
+# Authenticated users by token: (token expiry, detached User snapshot)
+_auth_cache = TTLCache(maxsize=4096, ttl=max(Config.AUTH_CACHE_TTL, 1))
+_auth_cache_lock = threading.Lock()
+
+
+def invalidate_auth_cache():
+    """Drop all cached token lookups (called whenever a user row changes)."""
+    with _auth_cache_lock:
+        _auth_cache.clear()
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    invalidate_auth_cache()
+
+
+def _authenticate(token):
+    """
+    Resolve a bearer token to a User in the current session.
+    
+    A repeat token within AUTH_CACHE_TTL skips the JWT decode and the SELECT:
+    a detached snapshot of the user is merged into the session with
+    load=False, which yields a normal persistent instance without SQL.
+    """
+    if not Config.AUTH_CACHE_TTL:
+        return User.verify_auth_token(token)
+    
+    with _auth_cache_lock:
+        entry = _auth_cache.get(token)
+    
+    if entry is not None:
+        expires_at, snapshot = entry
+        if expires_at > time.time():
+            return db.session.merge(snapshot, load=False)
+    
+    data = User.decode_auth_token(token)
+    if data is None:
+        return None
+    
+    user = db.session.get(User, data['user_id'])
+    if user is not None:
+        snapshot = User(**{attr.key: getattr(user, attr.key) for attr in User.__mapper__.column_attrs})
+        make_transient_to_detached(snapshot)
+        with _auth_cache_lock:
+            _auth_cache[token] = (data['exp'], snapshot)
+    
+    return user
+
 
 def jwt_required():
     """
     Decorator to protect API routes. Checks for a valid JWT in the Authorization header.
-    Stores the current authenticated user in the Flask global object (g.current_user).
+    Stores the current authenticated user in the Flask global object (g.current_user),
+    plus plain copies of its id, username and role (g.uid, g.uname, g.urole) that stay
+    readable without a refresh SELECT after the handler commits and expires the user.
     """
     def decorator(f):
         @wraps(f)
@@ -18,27 +99,30 @@ def jwt_required():
             # 1. Get token from header
             auth_header = request.headers.get('Authorization')
             if not auth_header:
-                return jsonify({'message': 'Authorization token is missing.'}), 401 # Unauthorized
+                return _error_response(_TOKEN_MISSING, 401) # Unauthorized
 
-            try:
-                # Expects format: "Bearer <token>"
-                token = auth_header.split()[1]
-            except IndexError:
-                return jsonify({'message': 'Token format is invalid. Use "Bearer <token>".'}), 401
+            # Expects format: "Bearer <token>" (scheme is case-insensitive)
+            scheme, _, token = auth_header.strip().partition(' ')
+            token = token.strip()
+            if scheme.lower() != 'bearer' or not token:
+                return _error_response(_TOKEN_MALFORMED, 401)
 
             # 2. Verify token and retrieve user
-            user = User.verify_auth_token(token)
+            user = _authenticate(token)
             
             if user is None:
                 # This covers invalid signature and token expiration
-                return jsonify({'message': 'Invalid or expired token.'}), 401
+                return _error_response(_TOKEN_INVALID, 401)
 
             # Check if user is active
             if not user.is_active:
-                return jsonify({'message': 'Account is deactivated.'}), 403
+                return _error_response(_ACCOUNT_DEACTIVATED, 403)
 
             # 3. Store user in global context (g) for route access
             g.current_user = user
+            g.uid = user.id
+            g.uname = user.username
+            g.urole = user.role
             
             # 4. Execute the original route function
             return f(*args, **kwargs)
@@ -53,15 +137,14 @@ def role_required(roles):
     Must be placed *after* @jwt_required in the decorator stack.
     """
     def decorator(f):
+        # Handle both Enum objects and string values from the DB
+        allowed = frozenset(roles).union(r.value for r in roles)
+        
         @wraps(f)
         def decorated_function(*args, **kwargs):
             # Check if the authenticated user's role is in the list of allowed roles
-            # Handle both Enum objects and string values from the DB
-            user_role = g.current_user.role
-            allowed_values = [r.value for r in roles]
-            
-            if user_role not in allowed_values and user_role not in roles:
-                 return jsonify({'message': 'Permission denied: Insufficient role access.'}), 403 # Forbidden
+            if g.urole not in allowed:
+                 return _error_response(_ROLE_DENIED, 403) # Forbidden
             return f(*args, **kwargs)
         return decorated_function
     return decorator
@@ -75,24 +158,26 @@ def admin_required():
         @wraps(f)
         def decorated_function(*args, **kwargs):
             # Check if user has admin role
-            if g.current_user.role != UserRole.SYSTEM_ADMIN.value:
-                return jsonify({
-                    'message': 'Admin privileges required',
-                    'current_role': g.current_user.role
-                }), 403
+            if g.urole != _ADMIN_VALUE:
+                return _error_response(_ADMIN_DENIED, 403)
             return f(*args, **kwargs)
         return decorated_function
     return decorator
 
 
-def audit_log(action=None, resource_type=None):
+def audit_log(action=None, resource_type=None, sample=1.0):
     """
     Decorator to automatically log API calls to the audit log.
     Captures request details, user information, and response status.
     
+    With AUDIT_ENABLED off the route is returned undecorated, so disabled
+    deployments pay nothing per request.
+    
     Args:
         action (str): Custom action name (if None, derives from function name)
         resource_type (str): Type of resource being accessed
+        sample (float): Fraction of calls to log (for high-traffic, low-value
+            routes); failures are always logged
     
     Usage:
         @audit_log(action='CREATE_USER', resource_type='User')
@@ -101,20 +186,18 @@ def audit_log(action=None, resource_type=None):
             ...
     """
     def decorator(f):
+        if not Config.AUDIT_ENABLED:
+            return f
+        
+        # Determine action name
+        action_name = action or f.__name__.upper()
+        
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            from app.services.audit_service import AuditService
-            
-            # Generate session ID if not exists
-            if not hasattr(g, 'session_id'):
-                g.session_id = str(uuid.uuid4())
-            
-            # Determine action name
-            action_name = action or f.__name__.upper().replace('_', '_')
+            sampled_out = sample < 1.0 and random.random() >= sample
             
             # Store start time for duration tracking
-            import time
-            start_time = time.time()
+            start_time = time.perf_counter()
             
             # Execute the route function
             try:
@@ -123,16 +206,21 @@ def audit_log(action=None, resource_type=None):
                 # Extract status code from response
                 if isinstance(response, tuple):
                     status_code = response[1] if len(response) > 1 else 200
-                    response_data = response[0]
                 else:
-                    status_code = 200
-                    response_data = response
+                    status_code = getattr(response, 'status_code', 200)
+                
+                if sampled_out and 200 <= status_code < 400:
+                    return response
                 
                 # Extract resource_id from kwargs if available
                 resource_id = kwargs.get('id') or kwargs.get('user_id') or kwargs.get('receipt_id')
                 
-                # Calculate duration
-                duration = time.time() - start_time
+                # Only include the optional parts that are present
+                metadata = {'duration_seconds': round(time.perf_counter() - start_time, 3)}
+                if request.args:
+                    metadata['query_params'] = request.args.to_dict()
+                if kwargs:
+                    metadata['path_params'] = kwargs
                 
                 # Log successful action
                 AuditService.log_action(
@@ -141,29 +229,26 @@ def audit_log(action=None, resource_type=None):
                     resource_id=resource_id,
                     status_code=status_code,
                     success=200 <= status_code < 400,
-                    metadata={
-                        'duration_seconds': round(duration, 3),
-                        'query_params': dict(request.args) if request.args else None,
-                        'path_params': kwargs
-                    },
-                    session_id=g.session_id
+                    metadata=metadata,
+                    session_id=generate_session_id()
                 )
                 
                 return response
                 
             except Exception as e:
                 # Log failed action
+                metadata = {'error_type': type(e).__name__}
+                if request.args:
+                    metadata['query_params'] = request.args.to_dict()
+                
                 AuditService.log_action(
                     action=action_name,
                     resource_type=resource_type,
                     status_code=500,
                     success=False,
                     error_message=str(e),
-                    metadata={
-                        'error_type': type(e).__name__,
-                        'query_params': dict(request.args) if request.args else None
-                    },
-                    session_id=g.session_id
+                    metadata=metadata,
+                    session_id=generate_session_id()
                 )
                 # Re-raise the exception
                 raise
@@ -174,12 +259,41 @@ def audit_log(action=None, resource_type=None):
 
 def generate_session_id():
     """
-    Generate a unique session ID for tracking user sessions.
-    Call this at the start of authentication.
+    Get the session ID for the current request.
+    Minted server-side (128 random bits) on first use and reused for the rest
+    of the request; client-supplied headers are never trusted for audit logs.
+    
+    Returns:
+        str: Session identifier
+    """
+    if 'session_id' not in g:
+        g.session_id = secrets.token_hex(16)
+    return g.session_id
+
+
+def stream_json_list(key, items, serialize=None, **extra):
+    """
+    Stream a JSON object of the form {key: [...], count: N, **extra}.
+    Rows are encoded one at a time with orjson so the full list is never
+    held in memory.
+    
+    Args:
+        key (str): Name of the list field in the response
+        items (iterable): Rows to serialize (e.g. a query using yield_per)
+        serialize (callable): Optional function converting a row to a dict
+        **extra: Additional top-level fields appended after the list
     
     Returns:
-        str: UUID session identifier
+        Response: A streaming application/json response
     """
-    if not hasattr(g, 'session_id'):
-        g.session_id = str(uuid.uuid4())
-    return g.session_id
\ No newline at end of file
+    def generate():
+        yield b'{' + orjson.dumps(key) + b':['
+        count = 0
+        for item in items:
+            row = dumps_bytes(serialize(item) if serialize else item)
+            yield row if count == 0 else b',' + row
+            count += 1
+        extra['count'] = count
+        yield b'],' + dumps_bytes(extra)[1:]
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
@@ -8,8 +8,10 @@ This file demonstrates different ways to add audit logging to your routes.
 # METHOD 1: Using the @audit_log Decorator (Recommended)
 # ============================================================================
 
-from flask import Blueprint, request, jsonify, g
-from app.utils import jwt_required, audit_log
+from flask import Blueprint, request, jsonify, g, current_app, send_from_directory
+from werkzeug.exceptions import NotFound
+from werkzeug.utils import secure_filename
+from app.utils import jwt_required, audit_log, generate_session_id
 from app.services.audit_service import AuditService
 
 bp = Blueprint('example', __name__)
@@ -62,7 +64,8 @@ def route_with_manual_logging():
             resource_id=result_id,
             success=True,
             metadata={
-                'input_data': data,
+                # Record which fields were sent, not the body itself (size and privacy)
+                'input_fields': sorted(data) if data else None,
                 'custom_field': 'value'
             }
         )
@@ -143,8 +146,8 @@ def view_resource(resource_id):
         resource_type='CustomResource',
         resource_id=resource_id,
         metadata={
-            'viewer_id': g.current_user.id,
-            'viewer_role': g.current_user.role
+            'viewer_id': g.uid,
+            'viewer_role': g.urole
         }
     )
     
@@ -173,7 +176,7 @@ def complex_operation():
         action='COMPLEX_OPERATION_STEP_1',
         resource_type='ComplexResource',
         success=True,
-        metadata={'step': 1, 'data': data}
+        metadata={'step': 1, 'input_fields': sorted(data) if data else None}
     )
     
     # Another sub-operation
@@ -192,8 +195,6 @@ def complex_operation():
 # METHOD 6: Logging with Custom Session ID
 # ============================================================================
 
-from app.utils import generate_session_id
-
 @bp.route('/with-session', methods=['POST'])
 @jwt_required()
 def operation_with_session_tracking():
@@ -229,9 +230,6 @@ def upload_document():
     """
     Real-world example: Document upload with comprehensive audit logging.
     """
-    from werkzeug.utils import secure_filename
-    import os
-    
     if 'file' not in request.files:
         # Log the error
         AuditService.log_action(
@@ -262,8 +260,8 @@ def upload_document():
                 'filename': filename,
                 'file_size': request.content_length,
                 'content_type': file.content_type,
-                'uploader_id': g.current_user.id,
-                'uploader_role': g.current_user.role
+                'uploader_id': g.uid,
+                'uploader_role': g.urole
             }
         )
         
@@ -290,6 +288,24 @@ def upload_document():
         return jsonify({'message': 'Upload failed', 'error': str(e)}), 500
 
 
+@bp.route('/documents/<filename>', methods=['GET'])
+@audit_log(action='DOWNLOAD_DOCUMENT', resource_type='Document')
+@jwt_required()
+def download_document(filename):
+    """
+    Real-world example: the download side of upload_document.
+    
+    send_from_directory hands the open file to the server (wsgi.file_wrapper,
+    or X-Sendfile with USE_X_SENDFILE) instead of reading it into memory, and
+    answers Range / If-Modified-Since requests itself. The @audit_log decorator
+    records the access; no file bytes pass through the audit metadata.
+    """
+    try:
+        return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename, conditional=True)
+    except NotFound:
+        return jsonify({'message': 'Document not found'}), 404
+
+
 # ============================================================================
 # BEST PRACTICES SUMMARY
 # ============================================================================
@@ -10,17 +10,97 @@ class Config:
     # Flask settings
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'a-very-secret-and-hard-to-guess-string'
     
+    # Application log level (DEBUG logs raw Gemini responses and extracted data)
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    
     # Database configuration (for PostgreSQL)
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Waitress worker threads (run.py / run_waitress.py)
+    WAITRESS_THREADS = int(os.environ.get('WAITRESS_THREADS', '16'))
+    
+    # Connection pool: keep connections open across requests (pre-ping drops
+    # ones the server closed, recycle stays under idle timeouts of proxies).
+    # At least one pooled connection per server thread, so requests never queue
+    # on the pool; overflow absorbs the audit writer and background jobs
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', '1800')),
+        'pool_pre_ping': True,
+    }
+    if (SQLALCHEMY_DATABASE_URI or '').startswith('postgresql'):
+        # Sizing only applies to QueuePool (in-memory SQLite uses StaticPool)
+        SQLALCHEMY_ENGINE_OPTIONS.update({
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', str(max(10, WAITRESS_THREADS)))),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', '20')),
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', '30')),
+            # psycopg2: batch executemany UPDATE/DELETE as well as INSERT
+            'executemany_mode': 'values_plus_batch',
+        })
+    
     # MongoDB configuration (for receipt storage)
     MONGODB_URL = os.environ.get('MONGODB_URL') or 'mongodb://localhost:27017/'
     
     # AI/Gemini API key
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
     
+    # Images sent to Gemini are downscaled to this long edge (pixels, 0 = send
+    # as uploaded) and re-encoded as JPEG at this quality
+    MAX_IMAGE_EDGE = int(os.environ.get('MAX_IMAGE_EDGE', '1568'))
+    JPEG_QUALITY = int(os.environ.get('JPEG_QUALITY', '85'))
+    
+    # Worker processes for image resizing (0 = resize in the request thread;
+    # Pillow releases the GIL in decode/resample, so threads already overlap)
+    IMAGE_PROCESS_WORKERS = int(os.environ.get('IMAGE_PROCESS_WORKERS', '0'))
+    
+    # Upload images once through the Gemini Files API and reuse the handle on
+    # repeat requests instead of sending the bytes inline every time
+    GEMINI_USE_FILES_API = os.environ.get('GEMINI_USE_FILES_API', 'false').lower() == 'true'
+    
+    # Maximum concurrent Gemini requests per process (extract_receipts_concurrent)
+    GEMINI_MAX_WORKERS = int(os.environ.get('GEMINI_MAX_WORKERS', '8'))
+    
+    # Receipts per multi-image Gemini request for bulk extraction
+    GEMINI_BATCH_SIZE = int(os.environ.get('GEMINI_BATCH_SIZE', '8'))
+    
+    # Coalesce concurrent uploads into multi-image Gemini requests (adds up to
+    # 100ms of latency per upload in exchange for fewer requests during bursts)
+    GEMINI_MICRO_BATCH = os.environ.get('GEMINI_MICRO_BATCH', 'false').lower() == 'true'
+    
+    # Re-run extraction for receipts stuck in ERROR every N minutes (0 = disabled)
+    RECEIPT_REPROCESS_INTERVAL_MINUTES = int(os.environ.get('RECEIPT_REPROCESS_INTERVAL_MINUTES', '0'))
+    # Give up on a receipt after this many re-extraction attempts
+    RECEIPT_REPROCESS_MAX_ATTEMPTS = int(os.environ.get('RECEIPT_REPROCESS_MAX_ATTEMPTS', '3'))
+    
     # File upload settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
-    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'heic'}
\ No newline at end of file
+    UPLOAD_FOLDER = os.path.abspath(os.environ.get('UPLOAD_FOLDER') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads'))
+    ALLOWED_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'gif', 'webp', 'heic'})
+    
+    # Serving uploaded files: let the web server send the bytes instead of Flask
+    # X-Sendfile (Apache/lighttpd) - Flask's built-in support for send_file()
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'
+    # Nginx X-Accel-Redirect prefix, e.g. '/internal/uploads/' with:
+    #   location /internal/uploads/ { internal; alias /path/to/uploads/; }
+    UPLOADS_ACCEL_REDIRECT_PREFIX = os.environ.get('UPLOADS_ACCEL_REDIRECT_PREFIX')
+    
+    # Seconds an authenticated token's user is reused without a SELECT (0 = off).
+    # Changes made through this process invalidate immediately; other worker
+    # processes may see a role change or deactivation up to this late
+    AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', '30'))
+    
+    # Report SQL statements per request in an X-Query-Count response header
+    # (development/integration aid for spotting N+1 queries), and log a warning
+    # above QUERY_COUNT_WARN_THRESHOLD statements (0 = never)
+    QUERY_COUNT_HEADER = os.environ.get('QUERY_COUNT_HEADER', 'false').lower() == 'true'
+    QUERY_COUNT_WARN_THRESHOLD = int(os.environ.get('QUERY_COUNT_WARN_THRESHOLD', '0'))
+    
+    # Audit logging on/off for @audit_log routes (read when routes are decorated)
+    AUDIT_ENABLED = os.environ.get('AUDIT_ENABLED', 'true').lower() == 'true'
+    
+    # Audit logging: batch inserts on a background thread instead of committing per request
+    AUDIT_LOG_ASYNC = os.environ.get('AUDIT_LOG_ASYNC', 'true').lower() == 'true'
+    
+    # Monthly audit_logs partitions to keep (0 = keep all). Only applies once
+    # audit_logs is partitioned (migrate_partition_audit_logs.py)
+    AUDIT_LOG_RETENTION_MONTHS = int(os.environ.get('AUDIT_LOG_RETENTION_MONTHS', '0'))
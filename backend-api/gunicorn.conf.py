@@ -0,0 +1,32 @@
+# gunicorn.conf.py
+
+"""
+Gunicorn settings for Linux/Docker deployments (picked up automatically when
+gunicorn is started from this directory, e.g. `gunicorn --bind 0.0.0.0:5000 run:app`).
+Windows keeps using Waitress via run_waitress.py.
+
+Requests spend most of their time waiting on Gemini, PostgreSQL and MongoDB,
+so each worker runs a thread pool (gthread) instead of the default single
+synchronous thread. Threads rather than gevent: psycopg2, the Gemini gRPC
+client and the audit writer / APScheduler threads do not cooperate with
+monkey-patched greenlets.
+"""
+
+import os
+from config import Config
+
+worker_class = 'gthread'
+
+# Same thread count Waitress uses, so DB pool sizing (pool_size >= threads)
+# holds for either server
+threads = Config.WAITRESS_THREADS
+
+# Each worker runs its own APScheduler jobs and audit writer; raise only if
+# duplicate scheduled jobs (exchange rates, receipt reprocessing) are acceptable
+workers = int(os.environ.get('GUNICORN_WORKERS', '1'))
+
+# Receipt extraction waits on Gemini for well over gunicorn's 30s default
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+
+# Keep connections from the frontend/proxy open between requests
+keepalive = 5
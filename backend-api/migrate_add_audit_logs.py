@@ -33,6 +33,18 @@ with app.app_context():
             print(f"Note: Column rename check/update skipped: {e}")
             db.session.rollback()
         
+        # Let the database fill in audit_logs.timestamp (naive UTC, as before)
+        try:
+            db.session.execute(text(
+                "ALTER TABLE audit_logs ALTER COLUMN timestamp "
+                "SET DEFAULT (clock_timestamp() AT TIME ZONE 'utc')"
+            ))
+            db.session.commit()
+            print("✓ Server-side default set for audit_logs.timestamp.")
+        except Exception as e:
+            print(f"Note: Timestamp default update skipped: {e}")
+            db.session.rollback()
+        
         print("✓ The audit_logs table is now ready to track user sessions and API calls.")
         
     except Exception as e:
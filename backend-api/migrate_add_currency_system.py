@@ -27,17 +27,59 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def check_table_exists(table_name):
+def check_table_exists(inspector, table_name):
     """Check if a table exists in the database."""
-    inspector = inspect(db.engine)
     return table_name in inspector.get_table_names()
 
-def check_column_exists(table_name, column_name):
+def check_column_exists(inspector, table_name, column_name):
     """Check if a column exists in a table."""
-    inspector = inspect(db.engine)
     columns = [col['name'] for col in inspector.get_columns(table_name)]
     return column_name in columns
 
+def backfill_original_amount(batch_size=10000):
+    """
+    Copy total_amount into transactions.original_amount and make it NOT NULL
+    without holding an exclusive lock for a full-table pass.
+    
+    Rows are updated in id ranges, each range committed on its own, so no single
+    transaction locks or rewrites the whole table. On PostgreSQL, NOT NULL is then
+    proven by a CHECK constraint added NOT VALID and validated separately
+    (VALIDATE only takes SHARE UPDATE EXCLUSIVE, so writes continue), which lets
+    SET NOT NULL skip its own scan (PostgreSQL 12+).
+    """
+    logger.info("Backfilling 'original_amount' from 'total_amount'...")
+    
+    with db.engine.connect() as conn:
+        min_id, max_id = conn.execute(text("SELECT min(id), max(id) FROM transactions")).one()
+    
+    updated = 0
+    if min_id is not None:
+        for low in range(min_id, max_id + 1, batch_size):
+            with db.engine.begin() as conn:
+                updated += conn.execute(text(
+                    "UPDATE transactions SET original_amount = total_amount "
+                    "WHERE id BETWEEN :low AND :high AND original_amount IS NULL"
+                ), {'low': low, 'high': low + batch_size - 1}).rowcount
+    logger.info(f"✓ Backfilled {updated} rows")
+    
+    if db.engine.dialect.name != 'postgresql':
+        logger.info("  Skipping NOT NULL on 'original_amount' (not supported by ALTER TABLE here)")
+        return
+    
+    constraint = 'transactions_original_amount_not_null'
+    with db.engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE transactions DROP CONSTRAINT IF EXISTS {constraint}"))
+        conn.execute(text(
+            f"ALTER TABLE transactions ADD CONSTRAINT {constraint} "
+            "CHECK (original_amount IS NOT NULL) NOT VALID"
+        ))
+    with db.engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE transactions VALIDATE CONSTRAINT {constraint}"))
+    with db.engine.begin() as conn:
+        conn.execute(text("ALTER TABLE transactions ALTER COLUMN original_amount SET NOT NULL"))
+        conn.execute(text(f"ALTER TABLE transactions DROP CONSTRAINT {constraint}"))
+    logger.info("✓ 'original_amount' set NOT NULL")
+
 def migrate():
     """Run the migration."""
     app = create_app()
@@ -46,80 +88,82 @@ def migrate():
         logger.info("Starting currency system migration...")
         
         try:
-            # Step 1: Create new tables
-            logger.info("Step 1: Creating new tables...")
-            
-            if not check_table_exists('currencies'):
-                logger.info("Creating 'currencies' table...")
-                Currency.__table__.create(db.engine)
-                logger.info("✓ 'currencies' table created")
-            else:
-                logger.info("✓ 'currencies' table already exists")
-            
-            if not check_table_exists('exchange_rates'):
-                logger.info("Creating 'exchange_rates' table...")
-                ExchangeRate.__table__.create(db.engine)
-                logger.info("✓ 'exchange_rates' table created")
-            else:
-                logger.info("✓ 'exchange_rates' table already exists")
-            
-            # Step 2: Add columns to existing tables
-            logger.info("\nStep 2: Adding new columns to existing tables...")
+            original_amount_pending = False
             
-            # Add preferred_currency to users table
-            if check_table_exists('users'):
-                if not check_column_exists('users', 'preferred_currency'):
-                    logger.info("Adding 'preferred_currency' column to 'users' table...")
-                    with db.engine.connect() as conn:
-                        conn.execute(text(
-                            "ALTER TABLE users ADD COLUMN preferred_currency VARCHAR(3) DEFAULT 'USD'"
-                        ))
-                        conn.commit()
-                    logger.info("✓ Added 'preferred_currency' column")
+            # Steps 1-2 run in one transaction (PostgreSQL DDL is transactional):
+            # a single commit, and a failure leaves the schema untouched
+            with db.engine.begin() as conn:
+                inspector = inspect(conn)
+                
+                # Step 1: Create new tables
+                logger.info("Step 1: Creating new tables...")
+                
+                if not check_table_exists(inspector, 'currencies'):
+                    logger.info("Creating 'currencies' table...")
+                    Currency.__table__.create(conn)
+                    logger.info("✓ 'currencies' table created")
                 else:
-                    logger.info("✓ 'preferred_currency' column already exists")
-            
-            # Add original_currency, original_amount, and exchange_rate_used to transactions table
-            if check_table_exists('transactions'):
-                if not check_column_exists('transactions', 'original_currency'):
-                    logger.info("Adding 'original_currency' column to 'transactions' table...")
-                    with db.engine.connect() as conn:
-                        conn.execute(text(
-                            "ALTER TABLE transactions ADD COLUMN original_currency VARCHAR(3) DEFAULT 'USD'"
-                        ))
-                        conn.commit()
-                    logger.info("✓ Added 'original_currency' column")
+                    logger.info("✓ 'currencies' table already exists")
+                
+                if not check_table_exists(inspector, 'exchange_rates'):
+                    logger.info("Creating 'exchange_rates' table...")
+                    ExchangeRate.__table__.create(conn)
+                    logger.info("✓ 'exchange_rates' table created")
                 else:
-                    logger.info("✓ 'original_currency' column already exists")
+                    logger.info("✓ 'exchange_rates' table already exists")
                 
-                if not check_column_exists('transactions', 'original_amount'):
-                    logger.info("Adding 'original_amount' column to 'transactions' table...")
-                    with db.engine.connect() as conn:
-                        # Copy existing total_amount to original_amount
+                # Step 2: Add columns to existing tables
+                logger.info("\nStep 2: Adding new columns to existing tables...")
+                
+                # Add preferred_currency to users table
+                if check_table_exists(inspector, 'users'):
+                    if not check_column_exists(inspector, 'users', 'preferred_currency'):
+                        logger.info("Adding 'preferred_currency' column to 'users' table...")
                         conn.execute(text(
-                            "ALTER TABLE transactions ADD COLUMN original_amount NUMERIC(10, 2)"
+                            "ALTER TABLE users ADD COLUMN preferred_currency VARCHAR(3) DEFAULT 'USD'"
                         ))
+                        logger.info("✓ Added 'preferred_currency' column")
+                    else:
+                        logger.info("✓ 'preferred_currency' column already exists")
+                
+                # Add original_currency, original_amount, and exchange_rate_used to transactions table
+                if check_table_exists(inspector, 'transactions'):
+                    transaction_columns = {col['name']: col for col in inspector.get_columns('transactions')}
+                    
+                    if 'original_currency' not in transaction_columns:
+                        logger.info("Adding 'original_currency' column to 'transactions' table...")
                         conn.execute(text(
-                            "UPDATE transactions SET original_amount = total_amount WHERE original_amount IS NULL"
+                            "ALTER TABLE transactions ADD COLUMN original_currency VARCHAR(3) DEFAULT 'USD'"
                         ))
+                        logger.info("✓ Added 'original_currency' column")
+                    else:
+                        logger.info("✓ 'original_currency' column already exists")
+                    
+                    if 'original_amount' not in transaction_columns:
+                        logger.info("Adding 'original_amount' column to 'transactions' table...")
+                        # Nullable without default: a catalog-only change. Existing rows
+                        # are filled in batches below, outside this transaction's lock
                         conn.execute(text(
-                            "ALTER TABLE transactions ALTER COLUMN original_amount SET NOT NULL"
+                            "ALTER TABLE transactions ADD COLUMN original_amount NUMERIC(10, 2)"
                         ))
-                        conn.commit()
-                    logger.info("✓ Added 'original_amount' column")
-                else:
-                    logger.info("✓ 'original_amount' column already exists")
-                
-                if not check_column_exists('transactions', 'exchange_rate_used'):
-                    logger.info("Adding 'exchange_rate_used' column to 'transactions' table...")
-                    with db.engine.connect() as conn:
+                        original_amount_pending = True
+                        logger.info("✓ Added 'original_amount' column")
+                    else:
+                        # Resume a backfill an earlier run did not finish
+                        original_amount_pending = transaction_columns['original_amount']['nullable']
+                        logger.info("✓ 'original_amount' column already exists")
+                    
+                    if 'exchange_rate_used' not in transaction_columns:
+                        logger.info("Adding 'exchange_rate_used' column to 'transactions' table...")
                         conn.execute(text(
                             "ALTER TABLE transactions ADD COLUMN exchange_rate_used NUMERIC(20, 10)"
                         ))
-                        conn.commit()
-                    logger.info("✓ Added 'exchange_rate_used' column")
-                else:
-                    logger.info("✓ 'exchange_rate_used' column already exists")
+                        logger.info("✓ Added 'exchange_rate_used' column")
+                    else:
+                        logger.info("✓ 'exchange_rate_used' column already exists")
+            
+            if original_amount_pending:
+                backfill_original_amount()
             
             # Step 3: Initialize currency catalog
             logger.info("\nStep 3: Initializing currency catalog...")
@@ -139,23 +183,23 @@ def migrate():
             
             # This is handled by SQLAlchemy model definitions
             # but we'll ensure they exist
+            # (after step 3, so the referenced currency codes exist)
             try:
-                with db.engine.connect() as conn:
+                with db.engine.begin() as conn:
                     # Check if FK for users.preferred_currency exists
-                    inspector = inspect(db.engine)
+                    inspector = inspect(conn)
                     fks = inspector.get_foreign_keys('users')
                     fk_exists = any(fk['constrained_columns'] == ['preferred_currency'] for fk in fks)
                     
-                    if not fk_exists and check_column_exists('users', 'preferred_currency'):
+                    if not fk_exists and check_column_exists(inspector, 'users', 'preferred_currency'):
                         conn.execute(text(
                             "ALTER TABLE users ADD CONSTRAINT fk_users_preferred_currency "
                             "FOREIGN KEY (preferred_currency) REFERENCES currencies(code)"
                         ))
-                        conn.commit()
                         logger.info("✓ Added foreign key constraint for users.preferred_currency")
                     else:
                         logger.info("✓ Foreign key constraint already exists")
-                        
+            
             except Exception as e:
                 logger.warning(f"⚠ Could not add foreign key constraints: {e}")
                 logger.info("  This is okay if they already exist or if using SQLite")
@@ -163,7 +207,7 @@ def migrate():
             logger.info("\n" + "="*50)
             logger.info("✓ Currency system migration completed successfully!")
             logger.info("="*50)
-            
+        
         except Exception as e:
             logger.error(f"\n✗ Migration failed: {e}")
             import traceback
@@ -0,0 +1,102 @@
+# migrate_add_query_indexes.py
+
+"""
+Database migration script to add query indexes to existing tables.
+
+db.create_all() only creates indexes for new tables, so existing databases
+need this script. Indexes are built (and replaced ones dropped) with
+CONCURRENTLY so the tables stay writable while the script runs.
+"""
+
+import sys
+import os
+
+# Add parent directory to Python path
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from app import create_app, db
+from app.services.audit_partition_service import AuditPartitionService
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# (index name, statement) - keep in sync with the models' __table_args__
+QUERY_INDEXES = [
+    (
+        'idx_audit_list_covering',
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_list_covering "
+        "ON audit_logs (timestamp DESC, id DESC) "
+        "INCLUDE (user_id, username, action, resource_type, resource_id, success, status_code)"
+    ),
+    (
+        'idx_audit_ts_id',  # replaced by idx_audit_list_covering
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_audit_ts_id"
+    ),
+    (
+        'ix_audit_logs_timestamp',  # redundant with idx_audit_list_covering / idx_audit_ts_brin
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_audit_logs_timestamp"
+    ),
+    (
+        'idx_audit_user_ts',
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_user_ts "
+        "ON audit_logs (user_id, timestamp DESC)"
+    ),
+    (
+        'idx_audit_failed_login',
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_failed_login "
+        "ON audit_logs (username, timestamp DESC) WHERE action = 'LOGIN_FAILED'"
+    ),
+    (
+        'idx_audit_resource',
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_resource "
+        "ON audit_logs (resource_type, resource_id, timestamp DESC)"
+    ),
+    (
+        'idx_audit_ts_brin',
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_audit_ts_brin "
+        "ON audit_logs USING BRIN (timestamp) WITH (pages_per_range = 32)"
+    ),
+    (
+        'idx_rate_code_ts',
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_rate_code_ts "
+        "ON exchange_rates (currency_code, timestamp DESC)"
+    ),
+    (
+        'idx_currency_timestamp',  # replaced by idx_rate_code_ts
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_currency_timestamp"
+    ),
+]
+
+def migrate():
+    """Run the migration."""
+    app = create_app()
+    
+    with app.app_context():
+        logger.info("Starting query index migration...")
+        
+        try:
+            # CONCURRENTLY cannot run inside a transaction block
+            with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                audit_partitioned = AuditPartitionService.is_partitioned(conn)
+                
+                for name, statement in QUERY_INDEXES:
+                    # Partitioned tables do not support CREATE INDEX CONCURRENTLY
+                    if audit_partitioned and name.startswith(('idx_audit_', 'ix_audit_logs_')):
+                        statement = statement.replace(' CONCURRENTLY', '')
+                    
+                    logger.info(f"Applying index '{name}'...")
+                    conn.execute(text(statement))
+                    logger.info(f"✓ Index '{name}' done")
+            
+            logger.info("✓ Query index migration completed successfully!")
+            
+        except Exception as e:
+            logger.error(f"✗ Migration failed: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            raise
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,71 @@
+# migrate_add_receipt_reprocess_tracking.py
+
+"""
+Database migration script to add re-extraction tracking to the receipts table.
+
+This script adds:
+1. receipts.reprocess_attempts - re-extraction attempts so far (capped by
+   RECEIPT_REPROCESS_MAX_ATTEMPTS)
+2. receipts.last_reprocess_at - time of the last attempt
+
+Both columns are added in one transaction. A constant default makes the
+ADD COLUMN a catalog-only change on PostgreSQL 11+ (no table rewrite).
+"""
+
+import sys
+import os
+
+# Add parent directory to Python path
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from app import create_app, db
+from sqlalchemy import inspect, text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# (column name, column definition) - keep in sync with the Receipt model
+REPROCESS_COLUMNS = [
+    ('reprocess_attempts', 'INTEGER NOT NULL DEFAULT 0'),
+    ('last_reprocess_at', 'TIMESTAMP'),
+]
+
+def migrate():
+    """Run the migration."""
+    app = create_app()
+    
+    with app.app_context():
+        logger.info("Starting receipt reprocess tracking migration...")
+        
+        try:
+            with db.engine.begin() as conn:
+                inspector = inspect(conn)
+                
+                if 'receipts' not in inspector.get_table_names():
+                    logger.info("✓ 'receipts' table does not exist yet, db.create_all() will add the columns")
+                    return
+                
+                existing = {col['name'] for col in inspector.get_columns('receipts')}
+                
+                for name, definition in REPROCESS_COLUMNS:
+                    if name in existing:
+                        logger.info(f"✓ '{name}' column already exists")
+                        continue
+                    
+                    logger.info(f"Adding '{name}' column to 'receipts' table...")
+                    conn.execute(text(f"ALTER TABLE receipts ADD COLUMN {name} {definition}"))
+                    logger.info(f"✓ Added '{name}' column")
+            
+            logger.info("\n" + "="*50)
+            logger.info("✓ Receipt reprocess tracking migration completed successfully!")
+            logger.info("="*50)
+        
+        except Exception as e:
+            logger.error(f"\n✗ Migration failed: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            raise
+
+if __name__ == '__main__':
+    migrate()
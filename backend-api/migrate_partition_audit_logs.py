@@ -0,0 +1,114 @@
+# migrate_partition_audit_logs.py
+
+"""
+Database migration script to convert audit_logs into a table partitioned by
+month on timestamp (PARTITION BY RANGE).
+
+This script:
+1. Renames the existing audit_logs table to audit_logs_legacy
+2. Creates the partitioned audit_logs table with the same columns
+   (primary key becomes (id, timestamp), as PostgreSQL requires the
+   partition key in every unique constraint)
+3. Creates one partition per month from the oldest row up to two months
+   ahead, plus a DEFAULT partition as a safety net
+4. Copies the rows over and drops audit_logs_legacy
+5. Recreates the AuditLog indexes (they become per-partition automatically)
+
+Upcoming partitions are created (and, with AUDIT_LOG_RETENTION_MONTHS set,
+old ones dropped) by the daily scheduler job in SchedulerService.
+
+Runs in a single transaction and locks audit_logs while copying; schedule it
+during a maintenance window on large tables.
+"""
+
+import sys
+import os
+
+# Add parent directory to Python path
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from app import create_app, db
+from app.models import AuditLog
+from app.services.audit_partition_service import AuditPartitionService, _add_months
+from datetime import date
+from sqlalchemy import text
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def migrate():
+    """Run the migration."""
+    app = create_app()
+    
+    with app.app_context():
+        logger.info("Starting audit_logs partitioning migration...")
+        
+        try:
+            with db.engine.begin() as conn:
+                if AuditPartitionService.is_partitioned(conn):
+                    logger.info("✓ audit_logs is already partitioned, nothing to do")
+                    return
+                
+                # Step 1: Move the existing table out of the way
+                logger.info("Step 1: Renaming audit_logs to audit_logs_legacy...")
+                conn.execute(text("LOCK TABLE audit_logs IN ACCESS EXCLUSIVE MODE"))
+                conn.execute(text("ALTER TABLE audit_logs RENAME TO audit_logs_legacy"))
+                conn.execute(text(
+                    "ALTER TABLE audit_logs_legacy RENAME CONSTRAINT audit_logs_pkey TO audit_logs_legacy_pkey"
+                ))
+                
+                # Step 2: Create the partitioned parent
+                logger.info("Step 2: Creating partitioned audit_logs table...")
+                conn.execute(text(
+                    "CREATE TABLE audit_logs (LIKE audit_logs_legacy INCLUDING DEFAULTS) "
+                    "PARTITION BY RANGE (timestamp)"
+                ))
+                conn.execute(text("ALTER TABLE audit_logs ADD PRIMARY KEY (id, timestamp)"))
+                conn.execute(text(
+                    "ALTER TABLE audit_logs ADD CONSTRAINT audit_logs_user_id_fkey "
+                    "FOREIGN KEY (user_id) REFERENCES users (id)"
+                ))
+                
+                # Step 3: Monthly partitions covering existing rows and the next two months
+                logger.info("Step 3: Creating monthly partitions...")
+                oldest = conn.execute(text("SELECT min(timestamp) FROM audit_logs_legacy")).scalar()
+                current_month = date.today().replace(day=1)
+                month_start = oldest.date().replace(day=1) if oldest else current_month
+                last_month = _add_months(current_month, 2)
+                
+                while month_start <= last_month:
+                    name = AuditPartitionService.create_month_partition(month_start, conn)
+                    logger.info(f"✓ Partition '{name}' created")
+                    month_start = _add_months(month_start, 1)
+                
+                AuditPartitionService.create_default_partition(conn)
+                logger.info("✓ Default partition created")
+                
+                # Step 4: Copy data and hand the id sequence to the new table
+                logger.info("Step 4: Copying rows...")
+                copied = conn.execute(text("INSERT INTO audit_logs SELECT * FROM audit_logs_legacy")).rowcount
+                logger.info(f"✓ Copied {copied} rows")
+                
+                conn.execute(text("ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id"))
+                conn.execute(text("DROP TABLE audit_logs_legacy"))
+                logger.info("✓ Dropped audit_logs_legacy")
+                
+                # Step 5: Recreate the model's indexes on the partitioned table
+                logger.info("Step 5: Creating indexes...")
+                for index in AuditLog.__table__.indexes:
+                    index.create(bind=conn)
+                    logger.info(f"✓ Index '{index.name}' created")
+            
+            logger.info("\n" + "="*50)
+            logger.info("✓ audit_logs partitioning migration completed successfully!")
+            logger.info("="*50)
+        
+        except Exception as e:
+            logger.error(f"\n✗ Migration failed: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            raise
+
+if __name__ == '__main__':
+    migrate()
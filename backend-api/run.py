@@ -36,7 +36,14 @@ if __name__ == '__main__':
         print("="*60)
         
         from waitress import serve
-        serve(app, host='127.0.0.1', port=5000, threads=4)
+        serve(
+            app,
+            host='127.0.0.1',
+            port=5000,
+            threads=app.config['WAITRESS_THREADS'],
+            connection_limit=1000,
+            channel_timeout=60
+        )
     except Exception as e:
         print(f"\nERROR: Failed to start server!")
         print(f"Error: {e}")
@@ -14,4 +14,11 @@ def initialize_database(app):
 if __name__ == '__main__':
     initialize_database(app)
     print("Starting Waitress server on http://127.0.0.1:5000")
-    serve(app, host='127.0.0.1', port=5000)
+    serve(
+        app,
+        host='127.0.0.1',
+        port=5000,
+        threads=app.config['WAITRESS_THREADS'],
+        connection_limit=1000,
+        channel_timeout=60
+    )
@@ -1,13 +1,33 @@
 import requests
 import json
+import os
+import socket
+import tempfile
 
 BASE_URL = "http://127.0.0.1:5000/api"
 
+# One keep-alive connection for all calls instead of a new socket per request
+session = requests.Session()
+
+SAMPLE_RECEIPT_URL = "https://templates.invoicehome.com/receipt-template-us-classic-white-750px.png"
+SAMPLE_RECEIPT_PATH = os.path.join(tempfile.gettempdir(), "sample_receipt.png")
+
+def sample_receipt():
+    """Download the sample receipt once; later runs upload the cached copy"""
+    if not os.path.exists(SAMPLE_RECEIPT_PATH):
+        # Plain requests.get: the session carries our API token, which must not go to a third-party host
+        response = requests.get(SAMPLE_RECEIPT_URL, timeout=30)
+        response.raise_for_status()
+        with open(SAMPLE_RECEIPT_PATH, "wb") as f:
+            f.write(response.content)
+    return SAMPLE_RECEIPT_PATH
+
 def test_api():
     print("Starting API Test...")
     try:
-        requests.get(BASE_URL.replace("/api", "/")) # Check root if possible, or just proceed
-    except Exception as e:
+        # Only check that something is listening; no request needs to be served
+        socket.create_connection(("127.0.0.1", 5000), timeout=0.5).close()
+    except OSError as e:
         print(f"Server check failed: {e}")
         # return # Don't return, try endpoints anyway
 
@@ -20,7 +40,7 @@ def test_api():
         "password": "password123",
         "role": "RECEIPT_LOGGER"
     }
-    response = requests.post(register_url, json=user_data)
+    response = session.post(register_url, json=user_data)
     print(f"Status Code: {response.status_code}")
     print(f"Response: {response.json()}")
     
@@ -34,7 +54,7 @@ def test_api():
         "username": "testuser_logger",
         "password": "password123"
     }
-    response = requests.post(login_url, json=login_data)
+    response = session.post(login_url, json=login_data)
     print(f"Status Code: {response.status_code}")
     data = response.json()
     print(f"Response: {data}")
@@ -44,17 +64,14 @@ def test_api():
         return
 
     token = data['access_token']
-    headers = {"Authorization": f"Bearer {token}"}
+    session.headers.update({"Authorization": f"Bearer {token}"})
 
     # 3. Upload Receipt
     print("\n--- 3. Testing Receipt Upload ---")
     upload_url = f"{BASE_URL}/receipts/upload"
-    # Using a sample receipt image URL
-    receipt_data = {
-        "image_url": "https://templates.invoicehome.com/receipt-template-us-classic-white-750px.png" 
-    }
-    
-    response = requests.post(upload_url, json=receipt_data, headers=headers)
+    # Upload a locally cached sample receipt rather than having the server fetch the URL each run
+    with open(sample_receipt(), "rb") as image:
+        response = session.post(upload_url, files={"image": ("sample_receipt.png", image, "image/png")})
     print(f"Status Code: {response.status_code}")
     print(f"Response: {response.json()}")
 
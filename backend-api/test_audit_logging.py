@@ -1,10 +1,16 @@
 # Test script for audit logging functionality
 
 from app import create_app, db
-from app.models import User, AuditLog
-from app.services.audit_service import AuditService
+from app.models import User
+from app.services.audit_service import AuditService, AuditLogWriter
 from datetime import datetime, timedelta
 
+def describe_log(log):
+    """Row id for a synchronous write, otherwise where the entry was handed off."""
+    if log is not None:
+        return log.id
+    return 'queued' if AuditLogWriter.is_running() else 'buffered'
+
 def test_audit_logging():
     """Test audit logging functionality"""
     app = create_app()
@@ -26,32 +32,42 @@ def test_audit_logging():
             db.session.commit()
             print(f"   ✓ Created test user: {test_user.username}")
         
-        # Log a login event
-        log1 = AuditService.log_authentication(
-            action='LOGIN',
-            username='test_audit',
-            success=True,
-            metadata={'test': 'login_test'}
-        )
-        print(f"   ✓ Logged authentication event (ID: {log1.id if log1 else 'Failed'})")
-        
-        # Log a failed login
-        log2 = AuditService.log_authentication(
-            action='LOGIN_FAILED',
-            username='wrong_user',
-            success=False,
-            error_message='Invalid credentials'
-        )
-        print(f"   ✓ Logged failed login event (ID: {log2.id if log2 else 'Failed'})")
-        
-        # Log a resource access
-        log3 = AuditService.log_resource_access(
-            action='VIEW_RECEIPT',
-            resource_type='Receipt',
-            resource_id=1,
-            metadata={'viewer': 'test_audit'}
-        )
-        print(f"   ✓ Logged resource access event (ID: {log3.id if log3 else 'Failed'})")
+        # Log inside a request context (as the API does) so method/endpoint are
+        # filled in; without the background writer, entries are buffered and
+        # inserted when the request context closes
+        with app.test_request_context('/test/audit-logging', method='POST'):
+            # Log a login event
+            log1 = AuditService.log_authentication(
+                action='LOGIN',
+                username='test_audit',
+                success=True,
+                metadata={'test': 'login_test'}
+            )
+            print(f"   ✓ Logged authentication event (ID: {describe_log(log1)})")
+            
+            # Log a failed login
+            log2 = AuditService.log_authentication(
+                action='LOGIN_FAILED',
+                username='wrong_user',
+                success=False,
+                error_message='Invalid credentials'
+            )
+            print(f"   ✓ Logged failed login event (ID: {describe_log(log2)})")
+            
+            # Log a resource access
+            log3 = AuditService.log_resource_access(
+                action='VIEW_RECEIPT',
+                resource_type='Receipt',
+                resource_id=1,
+                metadata={'viewer': 'test_audit'}
+            )
+            print(f"   ✓ Logged resource access event (ID: {describe_log(log3)})")
+        
+        # Let the background writer insert the queued entries before querying
+        if not AuditLogWriter.wait_until_idle():
+            print("   ✗ Background writer did not catch up in time")
+        if AuditLogWriter.failed_count():
+            print(f"   ✗ {AuditLogWriter.failed_count()} audit entries failed to write (see logs)")
         
         # Test 2: Query audit logs
         print("\n2. Testing audit log queries...")
@@ -102,9 +118,8 @@ def test_audit_logging():
         print("✓ ALL TESTS PASSED")
         print("=" * 60)
         
-        print("\n📊 Database contains {} audit log entries".format(
-            AuditLog.query.count()
-        ))
+        # Total from the statistics query above (one aggregate pass, no second COUNT)
+        print("\n📊 Database contains {} audit log entries".format(stats['total_logs']))
         
         return True
 
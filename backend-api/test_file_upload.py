@@ -2,26 +2,26 @@
 # Test script to verify the Gemini service works with uploaded files
 
 import os
+import base64
 from io import BytesIO
-from PIL import Image
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# 1x1 white PNG: the test only exercises the upload path, so a fixed image
+# avoids building and compressing a blank raster with Pillow on every run
+WHITE_PNG_1X1 = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAADElEQVR42mP4//8/AAX+Av4zEpUUAAAAAElFTkSuQmCC'
+)
+
 # Test with a sample image
 def test_gemini_with_file():
     """Test Gemini extraction with a file upload"""
     from app.services.gemini_service import extract_receipt_data
     
-    # Create a simple test image (you would replace this with an actual receipt image)
-    print("Creating test image...")
-    img = Image.new('RGB', (800, 600), color='white')
-    
-    # Save to BytesIO to simulate file upload
-    img_bytes = BytesIO()
-    img.save(img_bytes, format='PNG')
-    img_bytes.seek(0)  # Reset to beginning
+    # A blank test image as a file-like upload (you would replace this with an actual receipt image)
+    img_bytes = BytesIO(WHITE_PNG_1X1)
     
     print("Testing Gemini extraction with file upload...")
     result = extract_receipt_data(image_file=img_bytes)
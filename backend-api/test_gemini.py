@@ -3,21 +3,18 @@
 Simple test script to verify Gemini API key is working
 """
 
-import google.generativeai as genai
 from config import Config
+import sys
 
 def test_gemini_connection():
     """Test if the Gemini API key is valid and working"""
+    # Imported here so the no-key exit path skips loading the SDK
+    import google.generativeai as genai
+    
     try:
         # Configure the API
         genai.configure(api_key=Config.GEMINI_API_KEY)
         
-        # List available models
-        print("\nAvailable models:")
-        for m in genai.list_models():
-            if 'generateContent' in m.supported_generation_methods:
-                print(f"  - {m.name}")
-        
         # Try a simple text generation
         model = genai.GenerativeModel('gemini-2.5-flash')
         response = model.generate_content("Say 'Hello from Gemini!'")
@@ -28,11 +25,25 @@ def test_gemini_connection():
         
     except Exception as e:
         print(f"✗ Gemini API Error: {e}")
+        print_available_models(genai)
         return False
 
+def print_available_models(genai):
+    """List the models this key can use (only needed when generation failed)"""
+    try:
+        print("\nAvailable models:")
+        for m in genai.list_models():
+            if 'generateContent' in m.supported_generation_methods:
+                print(f"  - {m.name}")
+    except Exception as e:
+        print(f"  Could not list models: {e}")
+
 if __name__ == "__main__":
     print("Testing Gemini API connection...")
     print(f"API Key configured: {'Yes' if Config.GEMINI_API_KEY else 'No'}")
+    if not Config.GEMINI_API_KEY:
+        print("Set GEMINI_API_KEY in your .env file")
+        sys.exit(1)
     print(f"API Key (first 10 chars): {Config.GEMINI_API_KEY[:10]}...")
     print()
     test_gemini_connection()
@@ -1,17 +1,20 @@
 """Test the login endpoint with detailed error reporting."""
 import requests
 import json
+import orjson
 import traceback
 
 url = 'http://localhost:5000/api/auth/login'
 data = {'username': 'test', 'password': 'test'}
 
+session = requests.Session()
+
 print(f"Testing login at {url}")
 print(f"Payload: {json.dumps(data)}")
 print("="*50)
 
 try:
-    response = requests.post(
+    response = session.post(
         url,
         json=data,
         headers={'Content-Type': 'application/json'},
@@ -24,7 +27,7 @@ try:
     
     if response.status_code == 200:
         print("\nLogin successful!")
-        print(json.dumps(response.json(), indent=2))
+        print(orjson.dumps(orjson.loads(response.content), option=orjson.OPT_INDENT_2).decode())
     else:
         print(f"\nLogin failed with status {response.status_code}")
         
@@ -1,4 +1,5 @@
 """Test script to debug server startup issues"""
+import os
 import sys
 import traceback
 
@@ -15,8 +16,15 @@ try:
         db.create_all()
         print("Database tables initialized.")
     
-    print("Step 4: Starting Flask server...")
-    app.run(debug=True, host='127.0.0.1', port=5000, use_reloader=False)
+    # Same server as run_waitress.py; FLASK_DEBUG=1 switches to the Flask
+    # debug server for interactive tracebacks
+    if os.environ.get('FLASK_DEBUG'):
+        print("Step 4: Starting Flask debug server...")
+        app.run(debug=True, host='127.0.0.1', port=5000, use_reloader=False)
+    else:
+        from waitress import serve
+        print("Step 4: Starting Waitress server...")
+        serve(app, host='127.0.0.1', port=5000, threads=app.config['WAITRESS_THREADS'])
     
 except Exception as e:
     print(f"\nERROR OCCURRED:")
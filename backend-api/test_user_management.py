@@ -5,18 +5,26 @@ Run this after starting the server to test user management functionality.
 """
 
 import requests
-import json
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 
 BASE_URL = "http://localhost:5000/api"
 
+# One keep-alive connection for all steps instead of a new socket per request
+session = requests.Session()
+
 def print_response(response):
-    """Pretty print response"""
-    print(f"Status: {response.status_code}")
+    """Pretty print response (built first, then written with a single print)"""
     try:
-        print(f"Response: {json.dumps(response.json(), indent=2)}")
+        body = orjson.dumps(orjson.loads(response.content), option=orjson.OPT_INDENT_2).decode()
     except:
-        print(f"Response: {response.text}")
-    print("-" * 50)
+        body = response.text
+    print(f"Status: {response.status_code}\nResponse: {body}\n{'-' * 50}")
+
+def get_concurrently(*urls):
+    """GET independent read-only URLs in parallel; responses come back in order"""
+    with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+        return list(pool.map(session.get, urls))
 
 def test_user_management():
     """Test user management endpoints"""
@@ -27,7 +35,7 @@ def test_user_management():
     
     # Step 1: Register an admin user
     print("\n1. Registering admin user...")
-    response = requests.post(f"{BASE_URL}/auth/register", json={
+    response = session.post(f"{BASE_URL}/auth/register", json={
         "username": "admin",
         "email": "admin@example.com",
         "password": "admin123",
@@ -37,7 +45,7 @@ def test_user_management():
     
     # Step 2: Login as admin
     print("\n2. Logging in as admin...")
-    response = requests.post(f"{BASE_URL}/auth/login", json={
+    response = session.post(f"{BASE_URL}/auth/login", json={
         "username": "admin",
         "password": "admin123"
     })
@@ -45,21 +53,26 @@ def test_user_management():
     
     if response.status_code == 200:
         admin_token = response.json()['access_token']
-        headers = {"Authorization": f"Bearer {admin_token}"}
+        # Sent with every later request; the test user's steps pass their own header
+        session.headers.update({"Authorization": f"Bearer {admin_token}"})
+        
+        # Steps 3-4 are independent reads, fetched together
+        profile_response, roles_response = get_concurrently(
+            f"{BASE_URL}/users/me",
+            f"{BASE_URL}/users/roles"
+        )
         
         # Step 3: Get current user profile
         print("\n3. Getting current user profile...")
-        response = requests.get(f"{BASE_URL}/users/me", headers=headers)
-        print_response(response)
+        print_response(profile_response)
         
         # Step 4: Get available roles
         print("\n4. Getting available roles...")
-        response = requests.get(f"{BASE_URL}/users/roles", headers=headers)
-        print_response(response)
+        print_response(roles_response)
         
         # Step 5: Create a new user
         print("\n5. Creating new user...")
-        response = requests.post(f"{BASE_URL}/users", headers=headers, json={
+        response = session.post(f"{BASE_URL}/users", json={
             "username": "testuser",
             "email": "testuser@example.com",
             "password": "test123",
@@ -70,19 +83,23 @@ def test_user_management():
         if response.status_code == 201:
             user_id = response.json()['user']['id']
             
+            # Steps 6-7 are independent reads, fetched together
+            users_response, user_response = get_concurrently(
+                f"{BASE_URL}/users",
+                f"{BASE_URL}/users/{user_id}"
+            )
+            
             # Step 6: Get all users
             print("\n6. Getting all users...")
-            response = requests.get(f"{BASE_URL}/users", headers=headers)
-            print_response(response)
+            print_response(users_response)
             
             # Step 7: Get specific user
             print(f"\n7. Getting user {user_id}...")
-            response = requests.get(f"{BASE_URL}/users/{user_id}", headers=headers)
-            print_response(response)
+            print_response(user_response)
             
             # Step 8: Update user details
             print(f"\n8. Updating user {user_id} details...")
-            response = requests.put(f"{BASE_URL}/users/{user_id}", headers=headers, json={
+            response = session.put(f"{BASE_URL}/users/{user_id}", json={
                 "username": "testuser_updated",
                 "email": "testuser_updated@example.com"
             })
@@ -90,36 +107,36 @@ def test_user_management():
             
             # Step 9: Change user role
             print(f"\n9. Changing user {user_id} role...")
-            response = requests.put(f"{BASE_URL}/users/{user_id}/role", headers=headers, json={
+            response = session.put(f"{BASE_URL}/users/{user_id}/role", json={
                 "role": "RECEIPT_LOGGER"
             })
             print_response(response)
             
             # Step 10: Reset user password (admin)
             print(f"\n10. Resetting user {user_id} password (admin)...")
-            response = requests.post(f"{BASE_URL}/users/{user_id}/reset-password", headers=headers, json={
+            response = session.post(f"{BASE_URL}/users/{user_id}/reset-password", json={
                 "new_password": "newpassword123"
             })
             print_response(response)
             
             # Step 11: Deactivate user
             print(f"\n11. Deactivating user {user_id}...")
-            response = requests.post(f"{BASE_URL}/users/{user_id}/deactivate", headers=headers)
+            response = session.post(f"{BASE_URL}/users/{user_id}/deactivate")
             print_response(response)
             
             # Step 12: Get all users including inactive
             print("\n12. Getting all users (including inactive)...")
-            response = requests.get(f"{BASE_URL}/users?include_inactive=true", headers=headers)
+            response = session.get(f"{BASE_URL}/users?include_inactive=true")
             print_response(response)
             
             # Step 13: Reactivate user
             print(f"\n13. Reactivating user {user_id}...")
-            response = requests.post(f"{BASE_URL}/users/{user_id}/reactivate", headers=headers)
+            response = session.post(f"{BASE_URL}/users/{user_id}/reactivate")
             print_response(response)
             
             # Step 14: Login as the test user
             print("\n14. Logging in as test user...")
-            response = requests.post(f"{BASE_URL}/auth/login", json={
+            response = session.post(f"{BASE_URL}/auth/login", json={
                 "username": "testuser_updated",
                 "password": "newpassword123"
             })
@@ -131,7 +148,7 @@ def test_user_management():
                 
                 # Step 15: Test user changing their own password
                 print(f"\n15. User {user_id} changing own password...")
-                response = requests.put(f"{BASE_URL}/users/{user_id}/password", 
+                response = session.put(f"{BASE_URL}/users/{user_id}/password", 
                                        headers=user_headers, 
                                        json={
                     "current_password": "newpassword123",
@@ -141,7 +158,7 @@ def test_user_management():
                 
                 # Step 16: Test user updating their own profile
                 print(f"\n16. User {user_id} updating own profile...")
-                response = requests.put(f"{BASE_URL}/users/{user_id}", 
+                response = session.put(f"{BASE_URL}/users/{user_id}", 
                                        headers=user_headers, 
                                        json={
                     "email": "mynewemail@example.com"
@@ -150,7 +167,7 @@ def test_user_management():
             
             # Step 17: Delete user (as admin)
             print(f"\n17. Deleting user {user_id} (as admin)...")
-            response = requests.delete(f"{BASE_URL}/users/{user_id}", headers=headers)
+            response = session.delete(f"{BASE_URL}/users/{user_id}")
             print_response(response)
     
     print("\n" + "=" * 50)